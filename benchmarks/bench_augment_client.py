@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import time
+
+import openai
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import data_augment
+from stub_server import start_server
+
+# Compares a fresh openai.OpenAI per call (the old behaviour) against the shared pooled client.
+
+
+def run_fresh_clients(base_url, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        client = openai.OpenAI(base_url=base_url, api_key=data_augment.API_KEY)
+        client.chat.completions.create(
+            messages=[{"role": "user", "content": f"question {i}"}],
+            model=data_augment.MODEL_NAME,
+        )
+        client.close()
+    return time.perf_counter() - start
+
+
+def run_shared_client(base_url, calls):
+    data_augment.configure(data_augment.AugmentConfig(base_url=base_url))
+    data_augment.CALL_STATS = data_augment.CallStats()
+    start = time.perf_counter()
+    for i in range(calls):
+        data_augment.make_api_call(
+            data_augment.get_client(),
+            [{"role": "user", "content": f"question {i}"}],
+            data_augment.MODEL_NAME,
+        )
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-call vs shared OpenAI clients against a local stub.")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    fresh = run_fresh_clients(base_url, args.calls)
+    shared = run_shared_client(base_url, args.calls)
+
+    print(f"Fresh client per call: {fresh:.2f}s ({fresh / args.calls * 1000:.2f} ms/call)")
+    print(f"Shared pooled client:  {shared:.2f}s ({shared / args.calls * 1000:.2f} ms/call)")
+    print(data_augment.CALL_STATS.summary())
+    server.shutdown()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import split
+
+# Chunker throughput (MB/s, chunks/s) and peak RSS on a synthetic bips.txt-style corpus.
+
+DOCUMENT = """{n}. bip-{n:04d}.mediawiki
+<pre>
+  BIP: {n}
+  Layer: Consensus (soft fork)
+  Title: Synthetic proposal {n}
+</pre>
+
+==Abstract==
+
+This document specifies a synthetic proposal used to benchmark the chunker. {prose}
+
+==Specification==
+
+{prose}
+
+{{| class="wikitable"
+! Field !! Size !! Description
+|-
+| version || 4 || Transaction version
+|-
+| locktime || 4 || Lock time
+|}}
+
+===Reference implementation===
+
+```python
+def verify(tx):
+    # keep this block together
+    return tx.version >= 2
+```
+
+{prose}
+#######
+"""
+
+
+def generate_corpus(path, size_mb):
+    prose = "Nodes validate each transaction against the consensus rules before relaying it. " * 40
+    target = size_mb * 1024 * 1024
+    n = 1
+    with open(path, "w", encoding="utf-8") as f:
+        while f.tell() < target:
+            f.write(DOCUMENT.format(n=n, prose=prose))
+            n += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the structure-aware chunker.")
+    parser.add_argument("--corpus", default="synthetic_bips.txt")
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--tokenizer", default="", help="Hugging Face tokenizer name; empty for approximate counts")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.corpus) or os.path.getsize(args.corpus) < args.size_mb * 1024 * 1024:
+        print(f"Generating {args.size_mb} MB synthetic corpus at {args.corpus}")
+        generate_corpus(args.corpus, args.size_mb)
+
+    chunker = split.Chunker(args.max_tokens, args.overlap, split.load_token_counter(args.tokenizer))
+    size_mb = os.path.getsize(args.corpus) / (1024 * 1024)
+    start = time.perf_counter()
+    chunks = sum(1 for _ in chunker.chunk_file(args.corpus))
+    elapsed = time.perf_counter() - start
+
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    print(f"{size_mb:.0f} MB -> {chunks} chunks in {elapsed:.1f}s: "
+          f"{size_mb / elapsed:.1f} MB/s, {chunks / elapsed:.0f} chunks/s, peak RSS {peak_rss:.0f} MB")
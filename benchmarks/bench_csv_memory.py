@@ -0,0 +1,83 @@
+import argparse
+import csv
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "data"))
+
+# Peak RSS of the whole-file pandas load vs the streaming readers on a synthetic
+# augmented CSV. Each reader runs in its own subprocess so the peaks don't mix.
+
+
+def generate_csv(path, size_mb):
+    target = size_mb * 1024 * 1024
+    doc = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        while f.tell() < target:
+            source = (f"The following is a mediawiki document located at bip-{doc:04d}.mediawiki\n------\n"
+                      + f"BIP {doc} specification text. " * 300 + "\n------")
+            writer.writerow([source, f"Summary:\nSummary of `bip-{doc:04d}.mediawiki` " + "details " * 150])
+            for q in range(10):
+                writer.writerow([source, f"Q: Question {q} about BIP {doc}?\nA: " + "answer " * 200])
+            doc += 1
+
+
+def run_pandas(path):
+    import re
+    import pandas as pd
+    df = pd.read_csv(path, header=None)
+    full_text = "\n".join(df[1].astype(str).tolist())
+    return sum(1 for entry in re.split(r'(?=Q: |Summary:)', full_text) if entry.strip())
+
+
+def run_ingest_reader(path):
+    import qdrant_vector_db
+    return sum(1 for full, summary in qdrant_vector_db.iter_csv_rows(path)
+               if qdrant_vector_db.point_id(full, summary))
+
+
+def run_alpaca_reader(path):
+    import llm_data
+    return sum(1 for _ in llm_data.iter_alpaca_entries(path))
+
+
+READERS = {
+    "pandas": run_pandas,
+    "ingest-stream": run_ingest_reader,
+    "alpaca-stream": run_alpaca_reader,
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure peak RSS of CSV readers on a synthetic augmented CSV.")
+    parser.add_argument("--csv", default="synthetic_augmented.csv")
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--readers", nargs="*", default=list(READERS))
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        start = time.perf_counter()
+        items = READERS[args.run](args.csv)
+        print(f"{args.run:>14}: {items} items, {time.perf_counter() - start:.1f}s, peak RSS {peak_rss_mb():.0f} MB")
+        sys.exit(0)
+
+    if not os.path.exists(args.csv) or os.path.getsize(args.csv) < args.size_mb * 1024 * 1024:
+        print(f"Generating {args.size_mb} MB synthetic CSV at {args.csv}")
+        generate_csv(args.csv, args.size_mb)
+    print(f"CSV size: {os.path.getsize(args.csv) / (1024 * 1024):.0f} MB")
+
+    for reader in args.readers:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--csv", args.csv, "--run", reader], check=False)
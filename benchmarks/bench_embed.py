@@ -0,0 +1,38 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stub_server import start_server
+
+# Rows/sec for per-row vs batched embedding requests against a local Ollama stub.
+
+
+def rows_per_sec(fn, texts, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        fn(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-row vs batched embedding requests.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated per-request server latency in seconds")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    import qdrant_vector_db
+
+    texts = [f"Summary of BIP {i}: " + "lorem ipsum " * 40 for i in range(args.rows)]
+    per_row = rows_per_sec(lambda batch: [qdrant_vector_db.get_embedding(t) for t in batch], texts, args.batch_size)
+    batched = rows_per_sec(qdrant_vector_db.get_embeddings, texts, args.batch_size)
+
+    print(f"Per-row requests: {per_row:.0f} rows/sec")
+    print(f"Batched requests: {batched:.0f} rows/sec (batch size {args.batch_size})")
+    server.shutdown()
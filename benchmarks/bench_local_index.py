@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from local_index import LocalIndex
+from metrics import LatencyRecorder
+
+# Query latency and recall@k of the embedded local index (exact float32/float16 and IVF at
+# several nprobe values) against Qdrant, on synthetic clustered embeddings. Recall is
+# measured against exact float32 search. Qdrant is the server at --qdrant-url, or its
+# in-process local mode when no URL is given.
+
+
+def synthetic_embeddings(count, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    return centers[labels] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+
+
+def measure(name, search, queries, truth, top_k):
+    latency = LatencyRecorder(name)
+    found = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids = search(query)
+        latency.record(time.perf_counter() - start)
+        found += len(set(ids[:top_k]) & expected)
+    recall = found / (len(queries) * top_k)
+    print(f"{name:<28} p50 {1000 * latency.percentile(50):7.2f} ms   p99 {1000 * latency.percentile(99):7.2f} ms   "
+          f"recall@{top_k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local vector index against Qdrant.")
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=64)
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 4, 16])
+    parser.add_argument("--qdrant-url", help="Qdrant server to compare with; default is qdrant-client's local mode")
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.points + args.queries, args.dim, clusters=max(1, args.points // 50))
+    vectors, queries = vectors[:args.points], vectors[args.points:]
+    ids = [str(i) for i in range(args.points)]
+    payloads = [{"source": f"doc {i}", "summary": f"summary {i}"} for i in range(args.points)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = LocalIndex.build(os.path.join(tmp, "f32"), ids, vectors, payloads)
+        half = LocalIndex.build(os.path.join(tmp, "f16"), ids, vectors, payloads, dtype="float16")
+        start = time.perf_counter()
+        ivf = LocalIndex.build(os.path.join(tmp, "ivf"), ids, vectors, payloads, nlist=args.nlist)
+        print(f"{args.points} points x {args.dim} dims; IVF with {args.nlist} lists built in "
+              f"{time.perf_counter() - start:.1f}s")
+
+        truth = [{hit.id for hit in exact.search(query, args.top_k)} for query in queries]
+        measure("local exact float32", lambda q: [h.id for h in exact.search(q, args.top_k)], queries, truth, args.top_k)
+        measure("local exact float16", lambda q: [h.id for h in half.search(q, args.top_k)], queries, truth, args.top_k)
+        for nprobe in args.nprobe:
+            measure(f"local IVF nprobe={nprobe}", lambda q: [h.id for h in ivf.search(q, args.top_k, nprobe)],
+                    queries, truth, args.top_k)
+
+        from qdrant_client import QdrantClient
+        from qdrant_client.http import models
+        qdrant = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(":memory:")
+        collection = "bench_local_index"
+        if qdrant.collection_exists(collection):
+            qdrant.delete_collection(collection)
+        qdrant.create_collection(collection, vectors_config=models.VectorParams(size=args.dim,
+                                                                                distance=models.Distance.COSINE))
+        for i in range(0, args.points, 256):
+            qdrant.upsert(collection, points=models.Batch(ids=list(range(i, min(i + 256, args.points))),
+                                                          vectors=vectors[i:i + 256].tolist()), wait=True)
+
+        def qdrant_search(query):
+            return [str(hit.id) for hit in qdrant.search(collection, query_vector=query.tolist(), limit=args.top_k)]
+
+        measure("qdrant " + ("server" if args.qdrant_url else "local mode"), qdrant_search, queries, truth, args.top_k)
+        qdrant.delete_collection(collection)
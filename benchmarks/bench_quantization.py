@@ -0,0 +1,153 @@
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_local_index import synthetic_embeddings
+from content_store import ContentStore, resolve_sources
+from metrics import LatencyRecorder
+from qdrant_settings import quantization_config
+
+# Before/after report for the BIPs collection layout:
+#   before  float32 vectors in RAM, full document body in every payload
+#   after   quantized vectors in RAM, originals on disk with rescoring, payloads on disk
+#           and holding only a content store ID
+# Points reuse document bodies from the augmented CSV (several points per body, as in the
+# real collection) with synthetic embeddings. Reports estimated resident vector/payload
+# memory, snapshot size, on-disk size (with --storage-dir, Qdrant's storage directory),
+# and query latency and recall@k of the new layout against exact search on the old one.
+
+csv.field_size_limit(10**9)
+
+
+def load_rows(csv_file, count):
+    with open(csv_file, 'r', newline='', encoding='utf-8-sig') as f:
+        rows = [(row[0], row[1]) for row in csv.reader(f) if len(row) >= 2]
+    return [(rows[i % len(rows)][0], f"{rows[i % len(rows)][1]} ({i})") for i in range(count)]
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, names in os.walk(path) for name in names)
+
+
+def wait_until_optimized(qdrant, name, timeout=300):
+    start = time.time()
+    while time.time() - start < timeout:
+        if qdrant.get_collection(name).status == "green":
+            return
+        time.sleep(0.5)
+
+
+def snapshot_size(qdrant, name):
+    try:
+        snapshot = qdrant.create_snapshot(name, wait=True)
+        qdrant.delete_snapshot(name, snapshot.name)
+        return snapshot.size
+    except Exception:
+        return None  # not supported by qdrant-client's local mode
+
+
+def mb(size):
+    return f"{size / (1024 * 1024):9.1f} MB" if size is not None else "      n/a"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the old and quantized/separated collection layouts.")
+    parser.add_argument("--qdrant-url", help="Qdrant server; default is qdrant-client's local mode (no quantization)")
+    parser.add_argument("--storage-dir", help="Qdrant storage directory, to measure on-disk size per collection")
+    parser.add_argument("--csv", default=os.path.join(os.path.dirname(__file__), "..", "data", "test.csv"))
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--quantization", choices=["scalar", "binary"], default="scalar")
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models
+
+    qdrant = QdrantClient(url=args.qdrant_url, timeout=120.0) if args.qdrant_url else QdrantClient(":memory:")
+    rows = load_rows(args.csv, args.points)
+    vectors = synthetic_embeddings(args.points + args.queries, args.dim, clusters=max(1, args.points // 50))
+    vectors, queries = vectors[:args.points], vectors[args.points:]
+
+    tmp = tempfile.TemporaryDirectory()
+    store = ContentStore(os.path.join(tmp.name, "content.sqlite"))
+    source_ids = store.put_many([body for body, _ in rows])
+
+    layouts = {
+        "before": dict(on_disk=False, quantization=None, on_disk_payload=False,
+                       payloads=[{"source": body, "summary": summary} for body, summary in rows]),
+        "after": dict(on_disk=True, quantization=quantization_config(args.quantization), on_disk_payload=True,
+                      payloads=[{"source_id": i, "summary": summary} for i, (_, summary) in zip(source_ids, rows)]),
+    }
+    report = {}
+    for name, layout in layouts.items():
+        collection = f"bench_layout_{name}"
+        if qdrant.collection_exists(collection):
+            qdrant.delete_collection(collection)
+        qdrant.create_collection(
+            collection,
+            vectors_config=models.VectorParams(size=args.dim, distance=models.Distance.COSINE, on_disk=layout["on_disk"]),
+            quantization_config=layout["quantization"],
+            on_disk_payload=layout["on_disk_payload"]
+        )
+        for i in range(0, args.points, 256):
+            qdrant.upsert(collection, points=models.Batch(ids=list(range(i, min(i + 256, args.points))),
+                                                          vectors=vectors[i:i + 256].tolist(),
+                                                          payloads=layout["payloads"][i:i + 256]), wait=True)
+        wait_until_optimized(qdrant, collection)
+
+        payload_bytes = sum(len(str(p).encode("utf-8")) for p in layout["payloads"])
+        if layout["quantization"] is None:
+            resident = args.points * args.dim * 4
+        else:
+            resident = args.points * args.dim // (8 if args.quantization == "binary" else 1)
+        if not layout["on_disk_payload"]:
+            resident += payload_bytes
+        report[name] = {
+            "collection": collection,
+            "resident": resident,
+            "payload": payload_bytes,
+            "snapshot": snapshot_size(qdrant, collection),
+            "disk": directory_size(os.path.join(args.storage_dir, "collections", collection))
+            if args.storage_dir else None,
+        }
+
+    exact = models.SearchParams(exact=True)
+    rescored = models.SearchParams(quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0))
+    for name, params in (("before", None), ("after", rescored)):
+        latency = LatencyRecorder(name)
+        found = 0
+        for query in queries:
+            start = time.perf_counter()
+            hits = qdrant.search(report[name]["collection"], query_vector=query.tolist(), limit=args.top_k,
+                                 search_params=params, with_payload=True)
+            resolve_sources([hit.payload for hit in hits], store)
+            latency.record(time.perf_counter() - start)
+            truth = qdrant.search(report["before"]["collection"], query_vector=query.tolist(), limit=args.top_k,
+                                  search_params=exact, with_payload=False)
+            found += len({hit.id for hit in hits} & {hit.id for hit in truth})
+        report[name]["latency"] = latency
+        report[name]["recall"] = found / (len(queries) * args.top_k)
+
+    store_bytes = store.stats()["compressed_bytes"]
+    print(f"{args.points} points x {args.dim} dims, {len(set(source_ids))} distinct documents, "
+          f"{args.quantization} quantization" + ("" if args.qdrant_url else " (local mode: layout settings not applied)"))
+    print(f"{'':<8}{'vectors+payload RAM':>20}{'payloads':>13}{'snapshot':>13}{'disk':>13}"
+          f"{'p50':>10}{'p99':>10}{'recall@' + str(args.top_k):>11}")
+    for name, r in report.items():
+        print(f"{name:<8}{mb(r['resident']):>20}{mb(r['payload']):>13}{mb(r['snapshot']):>13}{mb(r['disk']):>13}"
+              f"{1000 * r['latency'].percentile(50):8.2f}ms{1000 * r['latency'].percentile(99):8.2f}ms"
+              f"{r['recall']:>11.3f}")
+    print(f"content store: {mb(store_bytes).strip()} compressed")
+
+    for r in report.values():
+        qdrant.delete_collection(r["collection"])
+    store.close()
+    tmp.cleanup()
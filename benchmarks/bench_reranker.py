@@ -0,0 +1,107 @@
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bm25_index import BM25Index
+from context_packer import ContextPacker
+from reranker import DEFAULT_MODEL, Reranker, passage
+from split import DOC_SEPARATOR
+
+# Cross-encoder reranking cost and effect on the BIPs corpus. Each BIP's title is a query
+# whose relevant document is that BIP; the first stage is the BM25 index over every
+# document (standing in for hybrid retrieval), returning --candidates candidates. For each
+# model variant this reports rerank latency uncached and cached, how often the relevant BIP
+# is in the top-k before and after reranking, and the packed prompt context for top-k
+# against passing every candidate.
+
+TITLE_RE = re.compile(r"Title:\s*(.+?)\s+(?:Author|Authors|Status|Layer|Comments-Summary|Type):")
+
+VARIANTS = {
+    "torch": dict(backend="torch", int8=False),
+    "torch-int8": dict(backend="torch", int8=True),
+    "onnx": dict(backend="onnx", int8=False),
+    "onnx-int8": dict(backend="onnx", int8=True),
+}
+
+
+def load_documents(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [doc.strip() for doc in f.read().split(DOC_SEPARATOR) if doc.strip()]
+
+
+def title_queries(documents, count):
+    queries = []
+    for i, doc in enumerate(documents):
+        match = TITLE_RE.search(doc)
+        if match and len(match.group(1).split()) >= 2:
+            queries.append((match.group(1), str(i)))
+    return queries[:count]
+
+
+def in_top(ids, relevant, top_k):
+    return relevant in [str(i) for i in ids[:top_k]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cross-encoder reranking on CPU.")
+    parser.add_argument("--docs", default=os.path.join(os.path.dirname(__file__), "..", "data", "split_bips.txt"))
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--variants", nargs="*", choices=sorted(VARIANTS), default=["torch", "torch-int8"])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--budget-ms", type=float, help="Latency budget per rerank")
+    parser.add_argument("--context-tokens", type=int, default=1500)
+    args = parser.parse_args()
+
+    documents = load_documents(args.docs)
+    queries = title_queries(documents, args.queries)
+    tmp = tempfile.TemporaryDirectory()
+    index = BM25Index(os.path.join(tmp.name, "bm25.sqlite"))
+    index.add_many([(str(i), doc, {"source": doc}) for i, doc in enumerate(documents)])
+    candidates = [index.search(query, args.candidates) for query, _ in queries]
+    print(f"{len(documents)} documents, {len(queries)} title queries, {args.candidates} BM25 candidates each")
+
+    first_stage = sum(in_top([hit.id for hit in hits], relevant, args.top_k)
+                      for hits, (_, relevant) in zip(candidates, queries))
+    print(f"{'BM25 only':<14} hit@{args.top_k} {first_stage / len(queries):.3f}")
+
+    packer = ContextPacker(max_tokens=args.context_tokens)
+    for name in args.variants:
+        start = time.perf_counter()
+        reranker = Reranker.open(args.model, batch_size=args.batch_size,
+                                 budget=args.budget_ms / 1000 if args.budget_ms else None,
+                                 version_file=os.path.join(tmp.name, "index_version"), **VARIANTS[name])
+        load_seconds = time.perf_counter() - start
+        # One untimed call so model warm-up is not counted as rerank latency
+        reranker.model.predict([(queries[0][0], documents[0][:200])], show_progress_bar=False)
+
+        found, top_tokens, all_tokens = 0, 0, 0
+        for (query, relevant), hits in zip(queries, candidates):
+            ids = [hit.id for hit in hits]
+            order = reranker.rerank(query, ids, [passage(hit.payload["source"]) for hit in hits], args.top_k)
+            found += in_top([ids[i] for i in order], relevant, args.top_k)
+            top_tokens += packer.pack(query, [{"text": hits[i].payload["source"]} for i in order]).tokens
+            all_tokens += sum(packer.count_tokens(hit.payload["source"]) for hit in hits)
+        cold = reranker.latency
+        reranker.latency = type(cold)("cached")
+        for (query, _), hits in zip(queries, candidates):
+            reranker.rerank(query, [hit.id for hit in hits], [passage(hit.payload["source"]) for hit in hits],
+                            args.top_k)
+        stats = reranker.stats()
+        print(f"{name:<14} hit@{args.top_k} {found / len(queries):.3f}   "
+              f"uncached p50 {1000 * cold.percentile(50):7.1f} ms p99 {1000 * cold.percentile(99):7.1f} ms   "
+              f"cached p50 {1000 * reranker.latency.percentile(50):5.2f} ms   "
+              f"{stats['ms_per_pair']:.2f} ms/pair, {stats['budget_cutoffs']} budget cutoffs, "
+              f"loaded in {load_seconds:.1f}s")
+        print(f"{'':<14} context tokens per prompt: {top_tokens / len(queries):.0f} (top {args.top_k}, packed) "
+              f"vs {all_tokens / len(queries):.0f} (all {args.candidates} candidates)")
+
+    index.close()
+    tmp.cleanup()
@@ -0,0 +1,100 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from metrics import LatencyRecorder
+
+# Load test for `inference.py --serve`: concurrent users POST /generate and the report
+# shows QPS, p50/p99 latency, decode throughput and batch sizes for each batching mode.
+# Unbatched serving (--max-batch 1) is the baseline for the old one-prompt-at-a-time REPL.
+# By default a tiny model runs on CPU in-process; pass --url to load a running server.
+
+
+def run_users(url, users, duration, max_new_tokens):
+    latency = LatencyRecorder("Latency")
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def user(u):
+        session = requests.Session()
+        n = 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{url}/generate", timeout=300, json={
+                    "prompt": f"user {u} question {n}: what does BIP {n % 400} specify?",
+                    "max_new_tokens": max_new_tokens
+                })
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                latency.record(time.perf_counter() - start)
+            else:
+                with lock:
+                    errors[0] += 1
+            n += 1
+
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latency, errors[0], time.perf_counter() - start
+
+
+def report(name, url, users, duration, max_new_tokens):
+    before = requests.get(f"{url}/stats", timeout=10).json()["batcher"]
+    latency, errors, elapsed = run_users(url, users, duration, max_new_tokens)
+    after = requests.get(f"{url}/stats", timeout=10).json()["batcher"]
+    tokens = after["generated_tokens"] - before["generated_tokens"]
+    line = (f"{name:<14}{users:>4} users: {latency.count / elapsed:6.2f} QPS, p50 {1000 * latency.percentile(50):7.0f} ms, "
+            f"p99 {1000 * latency.percentile(99):7.0f} ms, {tokens / elapsed:8.1f} tokens/s, {errors} errors")
+    if "batches" in after:
+        batches = after["batches"] - before["batches"]
+        line += f", avg batch {(after['prompts'] - before['prompts']) / batches if batches else 0.0:.1f}"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the batched inference server.")
+    parser.add_argument("--url", help="Existing server to load; by default servers are started in-process")
+    parser.add_argument("--base-model", default="hf-internal-testing/tiny-random-LlamaForCausalLM")
+    parser.add_argument("--adapter", default="", help="LoRA adapter directory")
+    parser.add_argument("--merge-lora", action="store_true")
+    parser.add_argument("--device", choices=["auto", "cuda", "cpu"], default="cpu")
+    parser.add_argument("--max-batch", type=int, nargs="*", default=[1, 8, 32])
+    parser.add_argument("--continuous", action="store_true", help="Also measure continuous batching")
+    parser.add_argument("--users", type=int, nargs="*", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.url:
+        for users in args.users:
+            report("server", args.url, users, args.duration, args.max_new_tokens)
+        sys.exit(0)
+
+    import inference
+    tokenizer, model = inference.load_model(args.base_model, args.adapter, args.device, args.merge_lora)
+    modes = [(f"batch {size}", dict(max_batch=size)) for size in args.max_batch]
+    if args.continuous:
+        modes.append(("continuous", dict(continuous=True)))
+    for name, options in modes:
+        server = inference.start_server(tokenizer, model, port=0, max_new_tokens=args.max_new_tokens, **options)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        # Untimed warm-up, so one-off allocation and kernel selection are not measured
+        run_users(url, 2, 1.0, args.max_new_tokens)
+        for users in args.users:
+            report(name, url, users, args.duration, args.max_new_tokens)
+        server.shutdown()
+        if options.get("continuous"):
+            server.batcher.manager.stop(block=True)
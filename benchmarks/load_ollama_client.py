@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stub_server import start_server
+
+# Requests/sec of ollama_client.generate_response at increasing concurrency, against
+# one stub that plays Ollama and Qdrant. Caches are disabled so every request does
+# the full embed -> search -> chat path.
+
+
+async def run_users(ollama_client, users, requests_per_user):
+    async def user(u):
+        for r in range(requests_per_user):
+            await ollama_client.generate_response(f"user {u} question {r}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(users)))
+    return users * requests_per_user / (time.perf_counter() - start)
+
+
+async def main(args):
+    server = start_server(latency=args.latency)
+    port = server.server_address[1]
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{port}"
+
+    import ollama_client
+    from qdrant_client import AsyncQdrantClient
+    ollama_client.qdrant = AsyncQdrantClient(host="127.0.0.1", port=port)
+    ollama_client.embedding_cache.maxsize = 0
+    ollama_client.answer_cache.maxsize = 0
+
+    for users in args.users:
+        rps = await run_users(ollama_client, users, args.requests)
+        print(f"{users:>4} concurrent users: {rps:7.1f} requests/sec")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the async RAG path against local stubs.")
+    parser.add_argument("--users", type=int, nargs="*", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=10, help="Requests per user")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated latency per stub call in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stub_server import start_server as start_stub
+from metrics import LatencyRecorder
+
+# Load test for server.py: concurrent users POST /ask against a RAG server whose OpenAI
+# and Qdrant upstreams are the local stub. Caches are disabled so every request does the
+# full embed -> search -> chat path. Reports QPS, p50/p99 latency and embedding batch sizes.
+# Pass --url to load an already running server instead.
+
+
+def run_users(url, users, duration, stream):
+    latency = LatencyRecorder("Latency")
+    ttft = LatencyRecorder("Time to first token")
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def user(u):
+        session = requests.Session()
+        n = 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{url}/ask", json={"question": f"user {u} question {n}", "stream": stream},
+                                        stream=stream, timeout=60)
+                if stream:
+                    first = True
+                    for line in response.iter_lines():
+                        if first and line.startswith(b"data: "):
+                            ttft.record(time.perf_counter() - start)
+                            first = False
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                latency.record(time.perf_counter() - start)
+            else:
+                with lock:
+                    errors[0] += 1
+            n += 1
+
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latency, ttft, errors[0], time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test server.py against local stubs.")
+    parser.add_argument("--url", help="Existing server to load; by default one is started against the stub")
+    parser.add_argument("--users", type=int, nargs="*", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--stream", action="store_true", help="Request SSE responses and report time to first token")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated latency per stub call in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed stub tokens")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait", type=float, default=0.005)
+    args = parser.parse_args()
+
+    url = args.url
+    if not url:
+        stub = start_stub(latency=args.latency, token_delay=args.token_delay)
+        stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+        os.environ["OPENAI_BASE_URL"] = f"{stub_url}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+        import client
+        import server
+        client.embedding_cache.maxsize = 0
+        client.answer_cache.maxsize = 0
+        server.configure_clients(stub_url, pool_size=max(args.users) * 2, timeout=30.0)
+        rag = server.start_server(port=0, max_batch=args.max_batch, max_wait=args.max_wait)
+        url = f"http://127.0.0.1:{rag.server_address[1]}"
+
+    for users in args.users:
+        before = requests.get(f"{url}/stats", timeout=10).json()["embedding_batches"]
+        latency, ttft, errors, elapsed = run_users(url, users, args.duration, args.stream)
+        after = requests.get(f"{url}/stats", timeout=10).json()["embedding_batches"]
+        batches = after["batches"] - before["batches"]
+        batch_size = (after["texts"] - before["texts"]) / batches if batches else 0.0
+        line = (f"{users:>4} users: {latency.count / elapsed:7.1f} QPS, p50 {1000 * latency.percentile(50):6.0f} ms, "
+                f"p99 {1000 * latency.percentile(99):6.0f} ms, {errors} errors, avg embedding batch {batch_size:.1f}")
+        if args.stream:
+            line += f", TTFT p50 {1000 * ttft.percentile(50):.0f} ms"
+        print(line)
@@ -0,0 +1,185 @@
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenAI-compatible, Ollama and Qdrant endpoints used by the bots and scripts.
+# Responses are canned; the point is to measure client-side overhead, not model quality.
+
+EMBEDDING_DIM = 768
+
+
+def fake_embedding(text, dim=EMBEDDING_DIM):
+    seed = sum(text.encode("utf-8")) or 1
+    return [((seed * (i + 1)) % 997) / 997.0 for i in range(dim)]
+
+
+def fake_completion(messages):
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    if system.startswith("Respond with a list"):
+        return "\n".join(f"Question {i + 1} about {user[:20]}?" for i in range(10))
+    return f"Stub answer for: {user[:60]}"
+
+
+def fake_hits(limit):
+    return [{
+        "id": str(uuid.UUID(int=i + 1)),
+        "version": 0,
+        "score": 1.0 - i * 0.01,
+        "payload": {
+            "source": f"The following is a mediawiki document located at bip-{i:04d}.mediawiki\n------\n"
+                      + f"BIP {i} specification text. " * 50 + "\n------",
+            "summary": f"Summary:\nSummary of `bip-{i:04d}.mediawiki`",
+        },
+        "vector": None,
+    } for i in range(limit)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True
+    wbufsize = -1  # headers and body go out in one write; flushed after each request
+    latency = 0.0
+    token_delay = 0.0  # seconds between streamed tokens
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, events, content_type):
+        """Chunked response, flushed after every event so clients see tokens as they are produced"""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, event in enumerate(events):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _openai_stream(self, body, tokens):
+        for token in tokens + [None]:
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": token} if token is not None else {},
+                    "finish_reason": None if token is not None else "stop",
+                }],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+
+    def _ollama_stream(self, body, tokens):
+        created_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        for token in tokens + [""]:
+            yield (json.dumps({
+                "model": body.get("model", "stub"),
+                "created_at": created_at,
+                "message": {"role": "assistant", "content": token},
+                "done": token == "",
+            }) + "\n").encode("utf-8")
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/":
+            self._send_json({"title": "qdrant - vector search engine (stub)", "version": "1.12.0"})
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.path.endswith("/chat/completions") and body.get("stream"):
+            tokens = re.findall(r"\S+\s*", fake_completion(body.get("messages", [])))
+            self._send_stream(self._openai_stream(body, tokens), "text/event-stream")
+        elif self.path.endswith("/chat/completions"):
+            self._send_json({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": fake_completion(body.get("messages", []))},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+        elif self.path.endswith("/embeddings") and "input" in body:
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            self._send_json({
+                "object": "list",
+                "model": body.get("model", "stub"),
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                         for i, text in enumerate(inputs)],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            })
+        elif self.path == "/api/embed":
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            self._send_json({
+                "model": body.get("model", "stub"),
+                "embeddings": [fake_embedding(text) for text in inputs],
+            })
+        elif re.fullmatch(r"/collections/[^/]+/points/search", self.path):
+            self._send_json({"result": fake_hits(body.get("limit", 10)), "status": "ok", "time": 0.0})
+        elif self.path == "/api/chat" and body.get("stream", True):
+            tokens = re.findall(r"\S+\s*", fake_completion(body.get("messages", [])))
+            self._send_stream(self._ollama_stream(body, tokens), "application/x-ndjson")
+        elif self.path == "/api/chat":
+            self._send_json({
+                "model": body.get("model", "stub"),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": fake_completion(body.get("messages", []))},
+                "done": True,
+            })
+        elif self.path == "/api/embeddings":
+            self._send_json({"embedding": fake_embedding(body.get("prompt", ""))})
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+
+def start_server(host="127.0.0.1", port=0, latency=0.0, token_delay=0.0):
+    """Start the stub in a background thread and return the server; port 0 picks a free port"""
+    handler = type("Handler", (StubHandler,), {"latency": latency, "token_delay": token_delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep before each response")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.latency, args.token_delay)
+    print(f"Stub server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,256 @@
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from local_index import LocalHit
+
+# Lexical index over the same rows as the Qdrant collection, for exact-term questions
+# ("BIP 341", "OP_CHECKSIGADD", field names) that dense search ranks poorly. Documents are
+# keyed by Qdrant point ID and keep that point's payload, so hits come back in the same
+# shape as a Qdrant search and can be fused with it.
+#
+# On disk (one SQLite file): a docs table with each document's length and payload, and a
+# postings table with one row per term holding zlib-compressed, delta-encoded document
+# numbers and term frequencies. Deleted documents are dropped from postings lazily and
+# compacted once they make up a fifth of the index.
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "bips_bm25.sqlite")
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens; numbers lose leading zeros so bip-0341 matches BIP 341"""
+    return [(token.lstrip("0") or "0") if token.isdigit() else token for token in TOKEN_RE.findall(text.lower())]
+
+
+def encode_postings(docs: np.ndarray, tfs: np.ndarray) -> bytes:
+    deltas = np.diff(docs, prepend=0).astype("<u4")
+    return zlib.compress(deltas.tobytes() + tfs.astype("<u2").tobytes())
+
+
+def decode_postings(data: bytes):
+    raw = zlib.decompress(data)
+    count = len(raw) // 6
+    docs = np.cumsum(np.frombuffer(raw, dtype="<u4", count=count), dtype=np.int64)
+    tfs = np.frombuffer(raw, dtype="<u2", offset=4 * count).astype(np.float32)
+    return docs, tfs
+
+
+class BM25Index:
+    """Okapi BM25 over documents keyed by Qdrant point ID. Safe to share between threads.
+
+    Several instances (a bot and an ingest run, say) may open the same file: each notices
+    commits made through the others and reloads before its next search or write.
+    """
+
+    def __init__(self, path: str = BM25_INDEX_PATH, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "doc INTEGER PRIMARY KEY, point_id TEXT UNIQUE NOT NULL, length INTEGER NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        """Document lengths and IDs live in memory; postings are read per query term"""
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        rows = self._conn.execute("SELECT doc, point_id, length FROM docs").fetchall()
+        size = max((doc for doc, _, _ in rows), default=0) + 1
+        self._lengths = np.zeros(size, dtype=np.float32)
+        self._doc_ids = {}
+        self._dead = 0
+        for doc, point_id, length in rows:
+            if length < 0:
+                self._dead += 1
+                continue
+            self._lengths[doc] = length
+            self._doc_ids[point_id] = doc
+        self._postings_cache = {}
+
+    def _refresh(self):
+        """Reload if another connection has committed to the index since _load"""
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load()
+
+    @contextmanager
+    def _writing(self):
+        """Hold the lock and SQLite's write lock over an up-to-date view; commit on success"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                yield
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            finally:
+                self._load()
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def __contains__(self, point_id) -> bool:
+        with self._lock:
+            self._refresh()
+            return str(point_id) in self._doc_ids
+
+    def _postings(self, term: str):
+        cached = self._postings_cache.get(term)
+        if cached is None:
+            row = self._conn.execute("SELECT data FROM postings WHERE term = ?", (term,)).fetchone()
+            cached = decode_postings(row[0]) if row else None
+            self._postings_cache[term] = cached
+        return cached
+
+    def _write_postings(self, additions: dict, removed: set):
+        """Merge new (doc, tf) pairs per term into the stored lists, dropping removed docs"""
+        for term, pairs in additions.items():
+            old = self._postings(term)
+            docs = np.array([doc for doc, _ in pairs], dtype=np.int64)
+            tfs = np.array([tf for _, tf in pairs], dtype=np.float32)
+            if old is not None:
+                keep = ~np.isin(old[0], list(removed)) if removed else slice(None)
+                docs = np.concatenate([old[0][keep], docs])
+                tfs = np.concatenate([old[1][keep], tfs])
+            order = np.argsort(docs, kind="stable")
+            self._conn.execute("INSERT OR REPLACE INTO postings (term, data) VALUES (?, ?)",
+                               (term, encode_postings(docs[order], np.minimum(tfs[order], 65535))))
+
+    def add_many(self, documents):
+        """Index (point_id, text, payload) triples; a point already indexed is replaced"""
+        with self._writing():
+            replaced = self._mark_deleted([str(point_id) for point_id, _, _ in documents])
+            additions = defaultdict(list)
+            for point_id, text, payload in documents:
+                counts = Counter(tokenize(text))
+                cursor = self._conn.execute(
+                    "INSERT INTO docs (point_id, length, payload) VALUES (?, ?, ?)",
+                    (str(point_id), sum(counts.values()), json.dumps(payload, ensure_ascii=False)),
+                )
+                for term, tf in counts.items():
+                    additions[term].append((cursor.lastrowid, tf))
+            self._write_postings(additions, replaced)
+        self._maybe_compact()
+
+    def _mark_deleted(self, point_ids) -> set:
+        """Flag documents as deleted (negative length); postings are cleaned up on compaction"""
+        docs = {self._doc_ids[point_id] for point_id in point_ids if point_id in self._doc_ids}
+        for doc in docs:
+            self._conn.execute("UPDATE docs SET length = -1, point_id = '#deleted:' || doc WHERE doc = ?", (doc,))
+        return docs
+
+    def delete(self, point_ids):
+        with self._writing():
+            self._mark_deleted([str(point_id) for point_id in point_ids])
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._dead and self._dead >= 0.2 * (len(self) + self._dead):
+            self.compact()
+
+    def compact(self):
+        """Rewrite every postings list without deleted documents"""
+        with self._writing():
+            dead = {row[0] for row in self._conn.execute("SELECT doc FROM docs WHERE length < 0")}
+            if not dead:
+                return
+            dead_array = np.fromiter(dead, dtype=np.int64)
+            for term, data in self._conn.execute("SELECT term, data FROM postings").fetchall():
+                docs, tfs = decode_postings(data)
+                keep = ~np.isin(docs, dead_array)
+                if keep.all():
+                    continue
+                if keep.any():
+                    self._conn.execute("UPDATE postings SET data = ? WHERE term = ?",
+                                       (encode_postings(docs[keep], tfs[keep]), term))
+                else:
+                    self._conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+            self._conn.execute("DELETE FROM docs WHERE length < 0")
+        with self._lock:
+            self._conn.execute("VACUUM")
+
+    def search(self, query: str, top_k: int = 3) -> list[LocalHit]:
+        with self._lock:
+            self._refresh()
+            live = self._lengths > 0
+            count = int(live.sum())
+            if not count:
+                return []
+            avg_length = float(self._lengths[live].mean())
+            norm = self.k1 * (1 - self.b + self.b * self._lengths / avg_length)
+            scores = np.zeros(len(self._lengths), dtype=np.float32)
+            for term in set(tokenize(query)):
+                postings = self._postings(term)
+                if postings is None:
+                    continue
+                docs, tfs = postings
+                # A list read after another instance's commit may hold docs newer than _lengths
+                docs_live = live[np.minimum(docs, len(live) - 1)] & (docs < len(live))
+                docs, tfs = docs[docs_live], tfs[docs_live]
+                if not len(docs):
+                    continue
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+            matched = np.flatnonzero(scores)
+            if not len(matched):
+                return []
+            k = min(top_k, len(matched))
+            top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            top = top[np.lexsort((top, -scores[top]))]
+            placeholders = ",".join("?" * len(top))
+            rows = dict((doc, (point_id, payload)) for doc, point_id, payload in self._conn.execute(
+                f"SELECT doc, point_id, payload FROM docs WHERE doc IN ({placeholders})", [int(d) for d in top]
+            ))
+        return [LocalHit(rows[doc][0], float(scores[doc]), json.loads(rows[doc][1])) for doc in top]
+
+    def stats(self) -> dict:
+        with self._lock:
+            terms, postings_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM postings"
+            ).fetchone()
+        return {"documents": len(self), "deleted": self._dead, "terms": terms, "postings_bytes": postings_bytes,
+                "file_bytes": os.path.getsize(self.path)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def from_env():
+    """The index at BM25_INDEX_PATH once qdrant_vector_db has built it, otherwise None"""
+    return BM25Index(BM25_INDEX_PATH) if os.path.exists(BM25_INDEX_PATH) else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the BM25 index built by qdrant_vector_db.py.")
+    parser.add_argument("query")
+    parser.add_argument("--index", default=BM25_INDEX_PATH)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    index = BM25Index(args.index)
+    start = time.perf_counter()
+    hits = index.search(args.query, args.top_k)
+    elapsed = time.perf_counter() - start
+    for i, hit in enumerate(hits, start=1):
+        print(f"{i}. {hit.id} (score {hit.score:.2f}) {hit.payload.get('summary', '')[:100]!r}")
+    print(f"{len(hits)} hits in {1000 * elapsed:.2f} ms; {index.stats()}")
@@ -1,9 +1,23 @@
 import os
+import time
 import uuid
-from openai import OpenAI
+import logging
+from openai import NOT_GIVEN, OpenAI
 from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from typing import List
+from typing import Iterator, List
+from embedding_cache import from_env as embedding_cache_from_env
+from semantic_cache import from_env as answer_cache_from_env
+from metrics import LatencyRecorder
+from context_packer import from_env as packer_from_env
+from local_index import from_env as local_index_from_env
+from content_store import resolve_sources
+from bm25_index import from_env as bm25_index_from_env
+from retrieval import fuse_points
+from qdrant_settings import SEARCH_PARAMS
+import reranker as rerank
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
 
 # Environment
 os.getenv('OPENAI_API_KEY')
@@ -11,49 +25,181 @@ client = OpenAI()
 qdrant = QdrantClient(host="localhost", port=6333)
 
 COLLECTION_NAME = "my_collection"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Repeat questions skip the embedding round trip (see embedding_cache.from_env)
+embedding_cache = embedding_cache_from_env()
+
+# Near-identical questions that retrieve the same points reuse the earlier answer.
+# Cleared automatically when qdrant_vector_db re-indexes the collection.
+answer_cache = answer_cache_from_env()
+
+# Optional retrieval.MultiRetriever; when set, answers draw on every store it queries
+# (e.g. BIPs and StackExchange) instead of the BIPs collection alone.
+retriever = None
+
+# Retrieved documents are cut down to their most relevant passages within a context
+# token budget rather than pasted whole into the prompt.
+packer = packer_from_env()
+
+# Set when LOCAL_INDEX_PATH names a local_index.py export: search in-process instead of
+# on the Qdrant server
+local_index = local_index_from_env()
+
+# Set when qdrant_vector_db has built a BM25 index: exact-term matches from it are fused
+# with the dense results
+bm25_index = bm25_index_from_env()
+
+# Set RERANK_MODEL (see reranker.py) to retrieve RERANK_CANDIDATES candidates and keep
+# only the top_k a cross-encoder ranks highest, instead of the top_k nearest neighbours
+reranker = rerank.from_env()
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+
+# Time from receiving a question to yielding the first token of its answer
+ttft = LatencyRecorder("Time to first token")
 
 # Get embedding from OpenAI
 def get_embedding(text: str) -> List[float]:
+    def embed():
+        response = client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=text,
+            encoding_format="float"
+        )
+        return response.data[0].embedding
+
+    return embedding_cache.get_or_compute(text, EMBEDDING_MODEL, embed)
+
+# Embed several texts in one request, in input order (uncached; server.py batches through this)
+def get_embeddings(texts: List[str]) -> List[List[float]]:
     response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text,
+        model=EMBEDDING_MODEL,
+        input=texts,
         encoding_format="float"
     )
-    return response.data[0].embedding
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
 # Search Qdrant with embedding
-def search_qdrant(query: str, top_k: int = 3) -> List[str]:
-    embedding = get_embedding(query)
-
-    search_result = qdrant.search(
+def search_qdrant_hits(embedding: List[float], top_k: int = 3):
+    if local_index is not None:
+        return local_index.search(embedding, top_k)
+    return qdrant.search(
         collection_name=COLLECTION_NAME,
         query_vector=embedding,
-        limit=top_k
+        limit=top_k,
+        search_params=SEARCH_PARAMS
     )
 
-    return [hit.payload["source"] for hit in search_result]
+# Dense search, run alongside a BM25 lookup and fused with it when a BM25 index is available
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
 
-# Generate response with GPT-4o-mini
-def generate_response(user_input: str) -> str:
-    context_chunks = search_qdrant(user_input, top_k=3)
-    context = "\n---\n".join(context_chunks)
+def search_hits(query: str, embedding: List[float], top_k: int = 3):
+    if bm25_index is None:
+        return search_qdrant_hits(embedding, top_k)
+    dense = _search_pool.submit(search_qdrant_hits, embedding, top_k)
+    lexical = bm25_index.search(query, top_k)
+    return fuse_points([dense.result(), lexical])[:top_k]
+
+# Search Qdrant with a query string
+def search_qdrant(query: str, top_k: int = 3) -> List[str]:
+    embedding = get_embedding(query)
+    search_result = search_hits(query, embedding, top_k)
+    return resolve_sources([hit.payload for hit in search_result])
+
+# IDs and {"text", "summary"} documents of the context for a question
+def retrieve_context(user_input: str, embedding: List[float], top_k: int = 3):
+    candidates = max(top_k, RERANK_CANDIDATES) if reranker is not None else top_k
+    if retriever is None:
+        hits = search_hits(user_input, embedding, candidates)
+        sources = resolve_sources([hit.payload for hit in hits])
+        ids = [str(hit.id) for hit in hits]
+        documents = [{"text": source, "summary": hit.payload.get("summary")} for hit, source in zip(hits, sources)]
+    else:
+        hits = retriever.search(user_input, candidates, embedding=embedding)
+        ids = [hit.id for hit in hits]
+        documents = [{"text": hit.text, "summary": hit.metadata.get("summary")} for hit in hits]
+    if reranker is None:
+        return ids, documents
+    order = reranker.rerank(user_input, ids, [rerank.passage(d["text"], d["summary"]) for d in documents], top_k)
+    return [ids[i] for i in order], [documents[i] for i in order]
+
+# Retrieval for callers with a deadline runs here, so it can be abandoned when time is up
+_retrieval_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="retrieve")
+
+def retrieve_context_within(user_input: str, embedding: List[float], top_k: int, timeout: float):
+    future = _retrieval_pool.submit(retrieve_context, user_input, embedding, top_k)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"retrieval took longer than {timeout:.2f}s")
+
+# Stream a response from GPT-4o-mini, token by token. timeout (seconds) covers retrieval
+# and generation together; running out raises TimeoutError or openai.APITimeoutError.
+def stream_response(user_input: str, embedding: List[float] | None = None,
+                    timeout: float | None = None) -> Iterator[str]:
+    start = time.perf_counter()
+    if embedding is None:
+        embedding = get_embedding(user_input)
+    if timeout is None:
+        point_ids, documents = retrieve_context(user_input, embedding, top_k=3)
+    else:
+        point_ids, documents = retrieve_context_within(user_input, embedding, 3, timeout)
+        # Generation gets whatever retrieval left of the budget
+        timeout -= time.perf_counter() - start
+        if timeout <= 0:
+            raise TimeoutError("no time left to generate an answer after retrieval")
+    cached = answer_cache.lookup(embedding, point_ids)
+    if cached is not None:
+        ttft.record(time.perf_counter() - start)
+        yield cached
+        return
+
+    context = packer.pack(user_input, documents)
 
     system_prompt = (
         "You are an expert assistant. Use the following context to answer the user's question as accurately as possible.\n\n"
-        f"{context}"
+        f"{context.text}"
     )
+    # Estimated here, replaced by the model's own count when it reports one
+    prompt_tokens = packer.count_tokens(system_prompt) + packer.count_tokens(user_input)
 
-    response = client.chat.completions.create(
+    stream = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_input}
         ],
         temperature=0.7,
-        max_tokens=500
+        max_tokens=500,
+        stream=True,
+        stream_options={"include_usage": True},
+        timeout=timeout if timeout is not None else NOT_GIVEN
     )
 
-    return response.choices[0].message.content.strip()
+    parts = []
+    for chunk in stream:
+        if chunk.usage:
+            prompt_tokens = chunk.usage.prompt_tokens
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        if not parts:
+            first_token = time.perf_counter() - start
+            ttft.record(first_token)
+            logger.info("Time to first token: %.3fs", first_token)
+        parts.append(delta)
+        yield delta
+
+    logger.info("Prompt tokens: %d (context %d, %d before packing)",
+                prompt_tokens, context.tokens, context.unpacked_tokens)
+    answer = "".join(parts).strip()
+    if answer:  # an empty stream is a failed answer, not one to replay
+        answer_cache.store(embedding, point_ids, answer)
+
+# Generate the full response with GPT-4o-mini
+def generate_response(user_input: str) -> str:
+    return "".join(stream_response(user_input)).strip()
 
 
 def chat_loop():
@@ -62,15 +208,26 @@ def chat_loop():
     while True:
         query = input("You: ")
         if query.lower() in {"exit", "quit"}:
+            print(embedding_cache.summary())
+            print(answer_cache.summary())
+            print(ttft.summary())
+            print(packer.summary())
+            if reranker is not None:
+                print(reranker.summary())
             print("👋 Exiting. Goodbye!")
             break
 
         try:
-            response = generate_response(query)
-            print(f"🤖 Bot: {response}\n")
+            print("🤖 Bot: ", end="", flush=True)
+            for token in stream_response(query):
+                print(token, end="", flush=True)
+            print("\n")
         except Exception as e:
             print(f"❌ Error: {e}\n")
 
 
 if __name__ == "__main__":
-    chat_loop()
\ No newline at end of file
+    # Per-answer time to first token and prompt token counts are logged at INFO
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per HTTP request otherwise
+    chat_loop()
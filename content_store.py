@@ -0,0 +1,99 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+
+# Document bodies referenced by ID from Qdrant point payloads. Many points share one BIP
+# body (a row per summary or chunk), so storing each body once here instead of in every
+# payload keeps the collection and its snapshots small.
+CONTENT_STORE_PATH = os.getenv("CONTENT_STORE_PATH", "bips_content.sqlite")
+
+
+def content_id(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]
+
+
+class ContentStore:
+    """zlib-compressed document bodies in a single SQLite file, keyed by content hash.
+
+    Safe to share between threads. Writing a body that is already stored is a no-op.
+    """
+
+    def __init__(self, path: str = CONTENT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS content (id TEXT PRIMARY KEY, body BLOB NOT NULL)")
+        self._conn.commit()
+
+    def put_many(self, bodies) -> list[str]:
+        ids = [content_id(body) for body in bodies]
+        rows = {i: body for i, body in zip(ids, bodies)}
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO content (id, body) VALUES (?, ?)",
+                [(i, zlib.compress(body.encode("utf-8"))) for i, body in rows.items()],
+            )
+            self._conn.commit()
+        return ids
+
+    def put(self, body: str) -> str:
+        return self.put_many([body])[0]
+
+    def get_many(self, ids) -> dict[str, str]:
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, body FROM content WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update((row_id, zlib.decompress(body).decode("utf-8")) for row_id, body in rows)
+        return found
+
+    def get(self, source_id: str) -> str | None:
+        return self.get_many([source_id]).get(source_id)
+
+    def retain(self, keep_ids) -> int:
+        """Delete every body not in keep_ids; returns how many were removed"""
+        keep_ids = set(keep_ids)
+        with self._lock:
+            stored = [row[0] for row in self._conn.execute("SELECT id FROM content")]
+            stale = [(i,) for i in stored if i not in keep_ids]
+            self._conn.executemany("DELETE FROM content WHERE id = ?", stale)
+            self._conn.commit()
+        return len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM content"
+            ).fetchone()
+        return {"entries": entries, "compressed_bytes": stored}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_store() -> ContentStore:
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ContentStore()
+        return _default_store
+
+
+def resolve_sources(payloads, store: ContentStore | None = None) -> list[str]:
+    """Document text for each point payload, whether it holds the body inline ("source")
+    or a reference into the content store ("source_id")"""
+    missing = [p["source_id"] for p in payloads if "source" not in p and "source_id" in p]
+    bodies = (store or default_store()).get_many(missing) if missing else {}
+    return [p["source"] if "source" in p else bodies.get(p.get("source_id"), "") for p in payloads]
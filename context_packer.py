@@ -0,0 +1,157 @@
+import io
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, List
+
+import split
+
+# Builds the prompt context for a question within a token budget instead of pasting whole
+# retrieved documents (full BIPs run to tens of thousands of characters). Each document
+# contributes its stored summary and its chunks most relevant to the question; passages
+# that repeat what is already packed are dropped, and everything is chosen with fixed
+# tie-breaks so the same hits always give the same context.
+
+TERM_RE = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it of on or that the this to was what when where which who why with".split()
+)
+
+
+def terms(text: str) -> List[str]:
+    return [term for term in TERM_RE.findall(text.lower()) if term not in STOPWORDS]
+
+
+def shingles(text: str, size: int = 5) -> set:
+    words = TERM_RE.findall(text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+@dataclass
+class Passage:
+    text: str
+    doc_rank: int  # position of its document in the retrieval results
+    start: int  # offset in the document; -1 for the summary
+    tokens: int
+    score: float = 0.0
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    unpacked_tokens: int  # what joining the full documents would have cost
+    passages: List[Passage]
+
+
+class ContextPacker:
+    def __init__(self, max_tokens: int = 1500, chunk_tokens: int = 192,
+                 count_tokens: Callable[[str], int] = split.approximate_token_count,
+                 duplicate_threshold: float = 0.8):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.chunker = split.Chunker(max_tokens=chunk_tokens, overlap_tokens=0, count_tokens=count_tokens)
+        # Every passage is charged for the separator that joins it to the next
+        self.separator_tokens = max(count_tokens("\n...\n"), count_tokens("\n---\n"))
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.packed_tokens = 0
+        self.unpacked_tokens = 0
+
+    def _candidates(self, documents):
+        summaries, chunks = [], []
+        for rank, document in enumerate(documents):
+            summary = (document.get("summary") or "").strip()
+            if summary:
+                summaries.append(Passage(summary, rank, -1, self.count_tokens(summary)))
+            for chunk in self.chunker.chunk_stream(io.StringIO(document["text"]), str(rank)):
+                if chunk.text.strip():
+                    chunks.append(Passage(chunk.text.strip(), rank, chunk.start, chunk.tokens))
+        return summaries, chunks
+
+    @staticmethod
+    def _score(query: str, chunks: List[Passage]):
+        """BM25 of each chunk against the question, with the chunks themselves as the corpus"""
+        query_terms = set(terms(query))
+        if not chunks or not query_terms:
+            return
+        counts = [Counter(terms(chunk.text)) for chunk in chunks]
+        avg_len = sum(sum(c.values()) for c in counts) / len(counts) or 1.0
+        df = Counter(term for c in counts for term in query_terms if term in c)
+        for chunk, c in zip(chunks, counts):
+            length = sum(c.values())
+            for term in query_terms:
+                if c[term]:
+                    idf = math.log(1 + (len(chunks) - df[term] + 0.5) / (df[term] + 0.5))
+                    chunk.score += idf * c[term] * 2.2 / (c[term] + 1.2 * (0.25 + 0.75 * length / avg_len))
+
+    def _truncate(self, passage: Passage, budget: int) -> Passage:
+        """Longest whole-word prefix of the passage that fits the budget"""
+        words = passage.text.split(" ")
+        low, high = 0, len(words)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count_tokens(" ".join(words[:mid])) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        text = " ".join(words[:low])
+        return Passage(text, passage.doc_rank, passage.start, self.count_tokens(text), passage.score)
+
+    def pack(self, query: str, documents: List[dict]) -> PackedContext:
+        """documents are {"text": ..., "summary": ...} in retrieval order"""
+        whole = [Passage(document["text"].strip(), rank, 0, self.count_tokens(document["text"]))
+                 for rank, document in enumerate(documents)]
+        unpacked_tokens = sum(p.tokens for p in whole)
+        if unpacked_tokens + self.separator_tokens * len(whole) <= self.max_tokens:
+            ranked = whole  # everything fits, nothing to cut
+        else:
+            summaries, chunks = self._candidates(documents)
+            self._score(query, chunks)
+            # Summaries first, then chunks by relevance; ties go to the better ranked document
+            # and then to the earlier passage, which keeps packing deterministic
+            ranked = summaries + sorted(chunks, key=lambda p: (-p.score, p.doc_rank, p.start))
+
+        selected, seen, remaining = [], [], self.max_tokens
+        for passage in ranked:
+            if passage.tokens + self.separator_tokens > remaining:
+                continue
+            passage_shingles = shingles(passage.text)
+            if any(len(passage_shingles & s) / len(passage_shingles) >= self.duplicate_threshold for s in seen):
+                continue
+            selected.append(passage)
+            seen.append(passage_shingles)
+            remaining -= passage.tokens + self.separator_tokens
+        if not selected and ranked:
+            selected.append(self._truncate(ranked[0], self.max_tokens))
+
+        # Back in reading order so each document's passages read top to bottom
+        selected.sort(key=lambda p: (p.doc_rank, p.start))
+        sections = []
+        for rank in sorted({p.doc_rank for p in selected}):
+            sections.append("\n...\n".join(p.text for p in selected if p.doc_rank == rank))
+        text = "\n---\n".join(sections)
+
+        packed = PackedContext(text, self.count_tokens(text), unpacked_tokens, selected)
+        with self._lock:
+            self.prompts += 1
+            self.packed_tokens += packed.tokens
+            self.unpacked_tokens += packed.unpacked_tokens
+        return packed
+
+    def summary(self) -> str:
+        with self._lock:
+            if not self.prompts:
+                return "Context packer: no prompts"
+            saved = 1 - self.packed_tokens / self.unpacked_tokens if self.unpacked_tokens else 0.0
+            return (f"Context packer: {self.prompts} prompts, avg {self.packed_tokens / self.prompts:.0f} context tokens "
+                    f"vs {self.unpacked_tokens / self.prompts:.0f} unpacked ({saved:.0%} saved)")
+
+
+def from_env():
+    """The packer for CONTEXT_MAX_TOKENS context tokens per prompt (default 1500)"""
+    return ContextPacker(max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "1500")))
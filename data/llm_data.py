@@ -1,61 +1,115 @@
+import argparse
 import csv
+import gzip
 import json
+import os
 import re
-import pandas as pd
-
-def process_csv_to_alpaca(input_csv, output_json):
-    alpaca_data = []
-    
-    df = pd.read_csv(input_csv, header=None)
-    
-    full_text = "\n".join(df[1].astype(str).tolist())
-    
-    entries = re.split(r'(?=Q: |Summary:)', full_text)
-    
-    for entry in entries:
-        entry = entry.strip()
-        if not entry:
-            continue
-            
-        if entry.startswith("Q: "):
-            qa_match = re.match(r'Q: (.*?)(?:\n|\r\n)A: (.*)', entry, re.DOTALL)
-            if qa_match:
-                question = qa_match.group(1).strip()
-                answer = qa_match.group(2).strip()
-                
-                alpaca_entry = {
-                    "instruction": f"Answer the following question about Bitcoin Improvement Proposal.:",
-                    "input": question,
-                    "output": answer,
-                    "system": "You are a helpful assistant that provides accurate information about Bitcoin Improvement Proposal.",
-                    "history": []
-                }
-                alpaca_data.append(alpaca_entry)
-                
-        elif entry.startswith("Summary:"):
-            summary_content = entry.replace("Summary:", "").strip()
-            
-            doc_name_match = re.search(r'Summary of `(.*?)`', summary_content)
-            doc_name = doc_name_match.group(1) if doc_name_match else "a document"
-            
-            alpaca_entry = {
-                "instruction": f"Provide a summary of {doc_name}",
-                "input": "",
-                "output": summary_content,
-                "system": "You are a helpful assistant that summarizes technical cryptocurrency documents accurately and concisely.",
+
+csv.field_size_limit(10**9)
+
+def parse_entry(text):
+    """Alpaca record for one augmented CSV cell (a "Q: ...\nA: ..." pair or a "Summary:" block)"""
+    entry = text.strip()
+
+    if entry.startswith("Q: "):
+        qa_match = re.match(r'Q: (.*?)(?:\n|\r\n)A: (.*)', entry, re.DOTALL)
+        if qa_match:
+            question = qa_match.group(1).strip()
+            answer = qa_match.group(2).strip()
+
+            return {
+                "instruction": f"Answer the following question about Bitcoin Improvement Proposal.:",
+                "input": question,
+                "output": answer,
+                "system": "You are a helpful assistant that provides accurate information about Bitcoin Improvement Proposal.",
                 "history": []
             }
-            alpaca_data.append(alpaca_entry)
-    
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(alpaca_data, f, indent=2, ensure_ascii=False)
-    
-    print(f"Processed {len(alpaca_data)} entries and saved to {output_json}")
-    return alpaca_data
+
+    elif entry.startswith("Summary:"):
+        summary_content = entry.replace("Summary:", "").strip()
+
+        doc_name_match = re.search(r'Summary of `(.*?)`', summary_content)
+        doc_name = doc_name_match.group(1) if doc_name_match else "a document"
+
+        return {
+            "instruction": f"Provide a summary of {doc_name}",
+            "input": "",
+            "output": summary_content,
+            "system": "You are a helpful assistant that summarizes technical cryptocurrency documents accurately and concisely.",
+            "history": []
+        }
+
+    return None
+
+def iter_alpaca_entries(input_csv):
+    """Stream Alpaca records from the augmented CSV, one CSV row at a time"""
+    with open(input_csv, 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            entry = parse_entry(row[1])
+            if entry is not None:
+                yield entry
+
+class JsonlWriter:
+    """Writes records as JSON lines, optionally split into shards of shard_size records and gzipped.
+
+    With sharding, output.jsonl becomes output-00000.jsonl, output-00001.jsonl, ...
+    """
+    def __init__(self, output_path, shard_size=None, compress=False):
+        # A .gz output path implies compression, so the suffix is never dropped from a plain file
+        self.compress = compress or output_path.endswith(".gz")
+        self.output_path = output_path[:-3] if output_path.endswith(".gz") else output_path
+        self.shard_size = shard_size
+        self.paths = []
+        self.count = 0
+        self._file = None
+
+    def _shard_path(self):
+        path = self.output_path
+        if self.shard_size:
+            base, ext = os.path.splitext(path)
+            path = f"{base}-{len(self.paths):05d}{ext or '.jsonl'}"
+        return path + ".gz" if self.compress else path
+
+    def _open_next(self):
+        if self._file is not None:
+            self._file.close()
+        path = self._shard_path()
+        self._file = gzip.open(path, 'wt', encoding='utf-8') if self.compress else open(path, 'w', encoding='utf-8')
+        self.paths.append(path)
+
+    def write(self, record):
+        if self._file is None or (self.shard_size and self.count % self.shard_size == 0):
+            self._open_next()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self._file is None:
+            self._open_next()  # always leave an output file, even for an empty input
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def process_csv_to_alpaca(input_csv, output_jsonl, shard_size=None, compress=False):
+    with JsonlWriter(output_jsonl, shard_size=shard_size, compress=compress) as writer:
+        for entry in iter_alpaca_entries(input_csv):
+            writer.write(entry)
+
+    print(f"Processed {writer.count} entries and saved to {', '.join(writer.paths)}")
+    return writer.count
 
 if __name__ == "__main__":
-    input_file = r"C:\Users\91745\OneDrive\Desktop\Summer Of Bitcoin\Bitcoin_Bips_bot\data\bips_augmented.csv"
-    output_file = r"C:\Users\91745\OneDrive\Desktop\Summer Of Bitcoin\Bitcoin_Bips_bot\data\data.json"
-    
-    processed_data = process_csv_to_alpaca(input_file, output_file)
-    print(f"First entry sample: {json.dumps(processed_data[0], indent=2)}")
+    parser = argparse.ArgumentParser(description="Convert the augmented CSV into Alpaca-format JSON lines.")
+    parser.add_argument("input_csv", help="Augmented CSV produced by data_augment.py")
+    parser.add_argument("output_jsonl", help="Output path, e.g. data/data.jsonl")
+    parser.add_argument("--shard-size", type=int, help="Start a new file every N records")
+    parser.add_argument("--gzip", action="store_true", help="Write gzip-compressed .jsonl.gz files (implied by a .gz output path)")
+    args = parser.parse_args()
+
+    process_csv_to_alpaca(args.input_csv, args.output_jsonl, shard_size=args.shard_size, compress=args.gzip)
@@ -1,16 +1,119 @@
 import openai
+import httpx
 import csv
 import os
-import sys
+import argparse
+import hashlib
 import logging
+import struct
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from sqlite_cache import SQLiteCache
 
 csv.field_size_limit(10**9)
 
 API_BASE_URL = "https://qwen7b.gaia.domains/v1"
 MODEL_NAME = "qwen7b"
 API_KEY = "gaia-"
+DEFAULT_CONCURRENCY = 1
+
+# Caps the number of requests in flight against the endpoint across all workers
+_api_slots = threading.BoundedSemaphore(DEFAULT_CONCURRENCY)
+
+def set_concurrency(limit):
+    global _api_slots
+    if limit < 1:
+        raise ValueError("Concurrency limit must be at least 1")
+    _api_slots = threading.BoundedSemaphore(limit)
+
+@dataclass
+class AugmentConfig:
+    base_url: str = API_BASE_URL
+    model: str = MODEL_NAME
+    api_key: str = API_KEY
+    timeout: float = 120.0
+    max_connections: int = DEFAULT_CONCURRENCY
+    keepalive_expiry: float = 60.0
+
+class CallStats:
+    """Per-call latency and HTTP connection reuse counters for the shared client"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_call(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.total_latency += seconds
+            self.max_latency = max(self.max_latency, seconds)
+
+    def on_request(self, request):
+        # httpcore reports connection pool events through the request's trace extension
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name, info):
+        if event_name in ("connection.connect_tcp.complete", "connection.connect_unix_socket.complete"):
+            with self._lock:
+                self.new_connections += 1
+
+    def on_response(self, response):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def reused_connections(self):
+        """Requests sent over a kept-alive connection rather than one opened for them"""
+        with self._lock:
+            return max(self.requests - self.new_connections, 0)
+
+    def summary(self):
+        reused = self.reused_connections
+        with self._lock:
+            avg = self.total_latency / self.calls if self.calls else 0.0
+            return (f"API calls: {self.calls}, avg latency: {avg:.3f}s, max latency: {self.max_latency:.3f}s, "
+                    f"HTTP requests: {self.requests}, new connections: {self.new_connections}, "
+                    f"reused connections: {reused}")
+
+CONFIG = AugmentConfig()
+CALL_STATS = CallStats()
+RESPONSE_CACHE = None  # SQLiteCache keyed by (model, messages); None disables caching
+_client = None
+_client_lock = threading.Lock()
+
+def configure(config):
+    """Replace the active config; the shared client is rebuilt on next use"""
+    global CONFIG, _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        CONFIG = config
+        _client = None
+
+def get_client():
+    """One long-lived client for every call, backed by a keep-alive connection pool"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=CONFIG.max_connections,
+                    max_keepalive_connections=CONFIG.max_connections,
+                    keepalive_expiry=CONFIG.keepalive_expiry,
+                ),
+                timeout=CONFIG.timeout,
+                event_hooks={"request": [CALL_STATS.on_request], "response": [CALL_STATS.on_response]},
+            )
+            _client = openai.OpenAI(base_url=CONFIG.base_url, api_key=CONFIG.api_key,
+                                    timeout=CONFIG.timeout, http_client=http_client)
+        return _client
 
 class ProcessingError(Exception):
     """Custom exception for processing failures after retries"""
@@ -30,15 +133,34 @@ def create_retry_decorator():
     )
 
 @create_retry_decorator()
+def create_completion(client, messages, model):
+    with _api_slots:
+        start = time.perf_counter()
+        try:
+            return client.chat.completions.create(
+                messages=messages,
+                model=model,
+                stream=False,
+            )
+        finally:
+            CALL_STATS.record_call(time.perf_counter() - start)
+
 def make_api_call(client, messages, model):
-    return client.chat.completions.create(
-        messages=messages,
-        model=model,
-        stream=False,
-    )
+    """Completion text for the messages, served from RESPONSE_CACHE when the same request was made before"""
+    cache_key = None
+    if RESPONSE_CACHE is not None:
+        cache_key = SQLiteCache.make_key(model, [(m["role"], m["content"]) for m in messages])
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    content = create_completion(client, messages, model).choices[0].message.content
+    if RESPONSE_CACHE is not None and content is not None:
+        RESPONSE_CACHE.set(cache_key, content)
+    return content
 
 def summarize(source_text):
-    client = openai.OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
+    client = get_client()
     messages = [
         {
             "role": "system",
@@ -61,11 +183,10 @@ def summarize(source_text):
             "content": source_text,
         }
     ]
-    chat_completion = make_api_call(client, messages, MODEL_NAME)
-    return chat_completion.choices[0].message.content
+    return make_api_call(client, messages, CONFIG.model)
 
 def qgen(source_text):
-    client = openai.OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
+    client = get_client()
     messages = [
         {
             "role": "system",
@@ -76,11 +197,10 @@ def qgen(source_text):
             "content": source_text,
         }
     ]
-    chat_completion = make_api_call(client, messages, MODEL_NAME)
-    return chat_completion.choices[0].message.content
+    return make_api_call(client, messages, CONFIG.model)
 
 def agen(source_text, question):
-    client = openai.OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
+    client = get_client()
     messages = [
         {
             "role": "system",
@@ -91,90 +211,189 @@ def agen(source_text, question):
             "content": question,
         }
     ]
-    chat_completion = make_api_call(client, messages, MODEL_NAME)
-    return chat_completion.choices[0].message.content
+    return make_api_call(client, messages, CONFIG.model)
+
+def augment_content(main_content, question_pool):
+    """Summary row followed by one Q&A row per generated question, in question order"""
+    summary_future = question_pool.submit(summarize, main_content)
+    qs = qgen(main_content)
+    questions = [q for q in qs.splitlines() if len(q.strip()) > 0]
+    answer_futures = [question_pool.submit(agen, main_content, q) for q in questions]
 
-def process_row(row, csv_writer, processed_contents, row_count):
+    rows = [[main_content, f"Summary:\n{summary_future.result()}"]]
+    for q, answer_future in zip(questions, answer_futures):
+        rows.append([main_content, f"Q: {q}\nA: {answer_future.result()}"])
+    return rows
+
+def process_row(main_content, row_number, question_pool):
     try:
-        main_content = row[0]
-
-        if main_content in processed_contents:
-            print(f"Skipping row because content has already been processed")
-            return row_count, 0
-
-        if len(main_content) > 32000:
-            print(f"Skipping row {row_count + 1}: content exceeds 32000 characters")
-            return row_count, 0
-
-        summary = summarize(main_content)
-        qs = qgen(main_content)
-        qna_list = []
-        
-        for q in qs.splitlines():
-            if len(q.strip()) == 0:
-                continue
-            answer = agen(main_content, q)
-            qna_list.append(f"Q: {q}\nA: {answer}")
-
-        csv_writer.writerow([main_content, f"Summary:\n{summary}"])
-        for qna in qna_list:
-            csv_writer.writerow([main_content, qna])
-        
-        processed_contents.add(main_content)
-        row_count += 1
-        print(f"Processed row {row_count}")
-        return row_count, 0
+        return augment_content(main_content, question_pool), 0
 
     except ProcessingError as pe:
-        print(f"Skipping row {row_count + 1} due to timeout: {str(pe)}")
-        return row_count, 1
+        print(f"Skipping row {row_number} due to timeout: {str(pe)}")
+        return None, 1
     except Exception as e:
-        print(f"Error processing row {row_count + 1}: {str(e)}")
-        return row_count, 1
+        print(f"Error processing row {row_number}: {str(e)}")
+        return None, 1
+
+
+class ProcessedIndex:
+    """Digests of the documents already in the output CSV, persisted next to it.
+
+    Each record is a 16-byte BLAKE2b digest of row[0] plus the CSV size after that
+    document's rows were flushed. If the CSV size no longer matches the last record
+    (older output, crash between the two writes) the index is rebuilt from the CSV once.
+    """
+    RECORD = struct.Struct("<16sQ")
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.index_path = output_path + ".idx"
+        self._digests = set()
+        if not self._load():
+            self._rebuild()
+        self._index_file = open(self.index_path, 'ab')
+
+    @staticmethod
+    def digest(content):
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+    def _csv_size(self):
+        return os.path.getsize(self.output_path) if os.path.exists(self.output_path) else 0
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return self._csv_size() == 0
+        last_offset = 0
+        with open(self.index_path, 'rb') as f:
+            for digest, offset in self.RECORD.iter_unpack(f.read()):
+                self._digests.add(digest)
+                last_offset = offset
+        if last_offset != self._csv_size():
+            self._digests.clear()
+            return False
+        return True
+
+    def _rebuild(self):
+        print(f"Rebuilding processed-row index from {self.output_path}")
+        csv_size = self._csv_size()
+        with open(self.index_path, 'wb') as index_file:
+            if csv_size:
+                with open(self.output_path, 'r', newline='', encoding='utf-8') as outfile:
+                    for row in csv.reader(outfile):
+                        digest = self.digest(row[0])
+                        if digest not in self._digests:
+                            self._digests.add(digest)
+                            index_file.write(self.RECORD.pack(digest, csv_size))
+
+    def __contains__(self, content):
+        return self.digest(content) in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+    def add(self, content, csv_size):
+        """Record a document once its rows are flushed; csv_size is the output size after the flush"""
+        digest = self.digest(content)
+        self._digests.add(digest)
+        self._index_file.write(self.RECORD.pack(digest, csv_size))
+        self._index_file.flush()
+
+    def close(self):
+        self._index_file.close()
 
 
 def load_processed_contents(output_path):
-    processed = set()
-    if os.path.exists(output_path):
-        with open(output_path, 'r', newline='', encoding='utf-8') as outfile:
-            csv_reader = csv.reader(outfile)
-            for row in csv_reader:
-                processed.add(row[0])
-    return processed
+    return ProcessedIndex(output_path)
 
 def main():
-    if len(sys.argv) != 3:
-        logging.error("Usage: python summarizer.py <input_csv> <output_csv>")
-        sys.exit(1)
-        
-    input_path = sys.argv[1]
-    output_path = sys.argv[2]
-    
+    global RESPONSE_CACHE
+    parser = argparse.ArgumentParser(description="Augment a CSV of documents with summaries and generated Q&A pairs.")
+    parser.add_argument("input_csv", help="CSV produced by github_parser.py")
+    parser.add_argument("output_csv", help="Augmented CSV; rows already present are skipped on rerun")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum number of requests in flight against the endpoint")
+    parser.add_argument("--base-url", default=API_BASE_URL, help="OpenAI-compatible endpoint")
+    parser.add_argument("--model", default=MODEL_NAME, help="Model name sent with each request")
+    parser.add_argument("--cache", help="Response cache file (default: <output_csv>.cache.sqlite)")
+    parser.add_argument("--cache-max-mb", type=int, default=1024, help="Evict least recently used responses above this size")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the endpoint")
+    args = parser.parse_args()
+
+    input_path = args.input_csv
+    output_path = args.output_csv
+    set_concurrency(args.concurrency)
+    configure(AugmentConfig(base_url=args.base_url, model=args.model, max_connections=args.concurrency))
+
+    if not args.no_cache:
+        RESPONSE_CACHE = SQLiteCache(args.cache or output_path + ".cache.sqlite", max_bytes=args.cache_max_mb * 1024 * 1024)
+
     processed_contents = load_processed_contents(output_path)
     row_count = 0
     skipped_rows = 0
 
+    # Rows are augmented concurrently but written strictly in input order, so the
+    # output is the same as a sequential run. The window bounds finished-but-unwritten rows.
+    row_pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    question_pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    window = 2 * args.concurrency
+    pending = deque()
+    in_flight = set()  # digests of documents submitted but not yet written
+
+    def write_next(csv_writer, outfile):
+        nonlocal row_count, skipped_rows
+        main_content, future = pending.popleft()
+        rows, skipped = future.result()
+        in_flight.discard(ProcessedIndex.digest(main_content))
+        skipped_rows += skipped
+        if rows is None:
+            return
+        csv_writer.writerows(rows)
+        outfile.flush()
+        processed_contents.add(main_content, os.fstat(outfile.fileno()).st_size)
+        row_count += 1
+        print(f"Processed row {row_count}")
+
     try:
         with open(input_path, 'r', newline='', encoding='utf-8') as infile, \
              open(output_path, 'a', newline='', encoding='utf-8') as outfile:
-            
+
             csv_reader = csv.reader(infile)
             csv_writer = csv.writer(outfile)
 
-            for row in csv_reader:
-                row_count, skipped = process_row(row, csv_writer, processed_contents, row_count)
-                skipped_rows += skipped
+            for row_number, row in enumerate(csv_reader, 1):
+                main_content = row[0]
+
+                if main_content in processed_contents or ProcessedIndex.digest(main_content) in in_flight:
+                    print(f"Skipping row because content has already been processed")
+                    continue
+
+                if len(main_content) > 32000:
+                    print(f"Skipping row {row_number}: content exceeds 32000 characters")
+                    continue
+
+                in_flight.add(ProcessedIndex.digest(main_content))
+                pending.append((main_content, row_pool.submit(process_row, main_content, row_number, question_pool)))
+                if len(pending) >= window:
+                    write_next(csv_writer, outfile)
 
-                outfile.flush()
+            while pending:
+                write_next(csv_writer, outfile)
 
     except KeyboardInterrupt:
         print("Process interrupted by user. Progress saved.")
     except Exception as e:
         logging.error(f"Unexpected error: {str(e)}")
     finally:
+        row_pool.shutdown(wait=False, cancel_futures=True)
+        question_pool.shutdown(wait=False, cancel_futures=True)
+        processed_contents.close()
         print(f"Modified data has been written to {output_path}")
         print(f"Total rows summarized: {row_count}")
         print(f"Total rows skipped: {skipped_rows}")
+        print(CALL_STATS.summary())
+        if RESPONSE_CACHE is not None:
+            print(RESPONSE_CACHE.summary())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_cache import SQLiteCache
+
+
+def normalize_query(text: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what a question asks"""
+    return re.sub(r'\s+', ' ', text).strip().rstrip('?!. ').lower()
+
+
+class EmbeddingCache:
+    """In-process LRU of query embeddings keyed on (model, normalized query text).
+
+    Entries older than ttl seconds are treated as misses. An optional SQLiteCache
+    backs the LRU so embeddings survive restarts.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, store: SQLiteCache | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()  # key -> (embedding, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def _key(self, text: str, model: str) -> str:
+        return SQLiteCache.make_key(model, normalize_query(text))
+
+    def _fresh(self, stored_at: float) -> bool:
+        return self.ttl is None or time.time() - stored_at < self.ttl
+
+    def get(self, text: str, model: str):
+        key = self._key(text, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry[1]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        if self.store is not None:
+            value = self.store.get(key)
+            if value is not None:
+                record = json.loads(value)
+                if self._fresh(record["stored_at"]):
+                    self._remember(key, record["embedding"], record["stored_at"])
+                    with self._lock:
+                        self.store_hits += 1
+                    return record["embedding"]
+        return None
+
+    def _remember(self, key: str, embedding, stored_at: float):
+        with self._lock:
+            self._entries[key] = (embedding, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def put(self, text: str, model: str, embedding):
+        key = self._key(text, model)
+        stored_at = time.time()
+        self._remember(key, embedding, stored_at)
+        if self.store is not None:
+            self.store.set(key, json.dumps({"embedding": embedding, "stored_at": stored_at}))
+
+    def get_or_compute(self, text: str, model: str, compute):
+        """Cached embedding for text, calling compute() only on a miss"""
+        start = time.perf_counter()
+        embedding = self.get(text, model)
+        if embedding is not None:
+            with self._lock:
+                self.hit_seconds += time.perf_counter() - start
+            return embedding
+
+        embedding = compute()
+        self.put(text, model, embedding)
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - start
+        return embedding
+
+    async def aget_or_compute(self, text: str, model: str, compute):
+        """Same as get_or_compute for a coroutine function compute"""
+        start = time.perf_counter()
+        embedding = self.get(text, model)
+        if embedding is not None:
+            with self._lock:
+                self.hit_seconds += time.perf_counter() - start
+            return embedding
+
+        embedding = await compute()
+        self.put(text, model, embedding)
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - start
+        return embedding
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.hits + self.store_hits
+            return {
+                "hits": self.hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "hit_rate": hits / (hits + self.misses) if hits + self.misses else 0.0,
+                "avg_hit_ms": 1000 * self.hit_seconds / hits if hits else 0.0,
+                "avg_miss_ms": 1000 * self.miss_seconds / self.misses if self.misses else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"Embedding cache: {s['hits']} hits, {s['store_hits']} store hits, {s['misses']} misses "
+                f"({s['hit_rate']:.0%} hit rate), avg hit {s['avg_hit_ms']:.2f} ms, avg miss {s['avg_miss_ms']:.1f} ms")
+
+
+def from_env():
+    """The query embedding cache: EMBEDDING_CACHE_PATH keeps embeddings across restarts
+    and EMBEDDING_CACHE_TTL (seconds) expires them"""
+    return EmbeddingCache(
+        maxsize=1024,
+        ttl=float(os.getenv("EMBEDDING_CACHE_TTL")) if os.getenv("EMBEDDING_CACHE_TTL") else None,
+        store=SQLiteCache(os.getenv("EMBEDDING_CACHE_PATH")) if os.getenv("EMBEDDING_CACHE_PATH") else None
+    )
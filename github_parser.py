@@ -1,13 +1,22 @@
 import os
+import json
+import hashlib
+import threading
 import requests
 import argparse
 import csv
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
-load_dotenv
+load_dotenv()
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+GITHUB_API_URL = "https://api.github.com"
+EXTENSIONS = ['.md', '.mediawiki']
 
-def get_github_contents(repo_url):
+def parse_repo_url(repo_url):
+    """(user, repo, branch, subpath) for a github.com URL; branch is None when the URL has no /tree/ part"""
     parts = repo_url.rstrip('/').split('/')
 
     if len(parts) < 5 or parts[2] != "github.com":
@@ -17,71 +26,204 @@ def get_github_contents(repo_url):
     repo = parts[4]
 
     if "tree" in parts:
-        branch = parts[6]
-        subpath = '/'.join(parts[7:]) if len(parts) > 7 else ''
-        api_url = f"https://api.github.com/repos/{user}/{repo}/contents/{subpath}?ref={branch}"
-    else:
-        api_url = f"https://api.github.com/repos/{user}/{repo}/contents/"
-
-    headers = {
-        "Authorization": f"Bearer {GITHUB_TOKEN}"
-    }
-
-    response = requests.get(api_url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-
-def process_contents(contents, paths=[], parent_path="", exclude_folders=[]):
-    headers = {
-        "Authorization": f"Bearer {GITHUB_TOKEN}"
-    }
-
-    for item in contents:
-        path = parent_path + item['name']
-        extension = os.path.splitext(path)[1]
-
-        if item['type'] == 'dir' and item['name'] in exclude_folders:
-            print(f"Skipping folder: {path}")
-            continue
-
-        if item['type'] == 'dir':
-            dir_response = requests.get(item['url'], headers=headers)
-            dir_response.raise_for_status()
-            dir_contents = dir_response.json()
-            process_contents(dir_contents, paths, path + "/", exclude_folders)
-
-        elif item['type'] == 'file':
-            if extension not in ['.md', '.mediawiki']:
-                print(f"Skipping file: {path}")
+        return user, repo, parts[6], '/'.join(parts[7:]) if len(parts) > 7 else ''
+    return user, repo, None, ''
+
+
+class GitHubCrawler:
+    """Crawls a repository with one recursive git trees request and fetches blobs concurrently.
+
+    Requests share one pooled session. Tree and metadata responses are cached with
+    their ETags, so a re-crawl of an unchanged repo costs 304s, which GitHub does not
+    count against the rate limit. Blobs are cached by SHA and cost nothing once fetched.
+    """
+
+    def __init__(self, api_url=GITHUB_API_URL, token=GITHUB_TOKEN, cache_dir=".github_cache", workers=8):
+        self.api_url = api_url.rstrip('/')
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.requests_made = 0
+        self.not_modified = 0
+        self.blob_cache_hits = 0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+        os.makedirs(os.path.join(cache_dir, "responses"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "blobs"), exist_ok=True)
+        self.etags_path = os.path.join(cache_dir, "etags.json")
+        self.etags = {}
+        if os.path.exists(self.etags_path):
+            with open(self.etags_path, 'r', encoding='utf-8') as f:
+                self.etags = json.load(f)
+
+    def _get_json(self, url):
+        """GET with If-None-Match; a 304 is answered from the cached body"""
+        body_path = os.path.join(self.cache_dir, "responses", hashlib.sha1(url.encode()).hexdigest() + ".json")
+        headers = {}
+        if url in self.etags and os.path.exists(body_path):
+            headers["If-None-Match"] = self.etags[url]
+
+        response = self.session.get(url, headers=headers)
+        with self._lock:
+            self.requests_made += 1
+        if response.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+            with open(body_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        response.raise_for_status()
+        with open(body_path, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        if "ETag" in response.headers:
+            with self._lock:
+                self.etags[url] = response.headers["ETag"]
+        return response.json()
+
+    def list_files(self, user, repo, branch=None, subpath='', exclude_folders=()):
+        """Blob entries under subpath with a wanted extension, sorted by path"""
+        if not branch:
+            branch = self._get_json(f"{self.api_url}/repos/{user}/{repo}")["default_branch"]
+        tree = self._get_json(f"{self.api_url}/repos/{user}/{repo}/git/trees/{branch}?recursive=1")
+        if tree.get("truncated"):
+            print("Warning: tree listing was truncated by the API; some files may be missing")
+
+        prefix = subpath.strip('/') + '/' if subpath.strip('/') else ''
+        files = []
+        for item in tree["tree"]:
+            if item["type"] != "blob" or not item["path"].startswith(prefix):
                 continue
-
-            print(f"Processing: {path}")
-            file_response = requests.get(item['download_url'], headers=headers)
-            file_response.raise_for_status()
-            file_content = file_response.text
-            paths.append({"Path": path, "Content": file_content})
-
-    print(f"Finished processing. Total files processed: {len(paths)}.")
-    return paths
-
-
-def transform_and_write_csv(data, output_csv):
-    with open(output_csv, mode='w', newline='', encoding='utf-8') as outfile:
+            path = item["path"][len(prefix):]
+            folders = path.split('/')[:-1]
+            if any(folder in exclude_folders for folder in folders):
+                continue
+            if os.path.splitext(path)[1] not in EXTENSIONS:
+                continue
+            files.append({"path": path, "sha": item["sha"], "url": item["url"]})
+        return sorted(files, key=lambda f: f["path"])
+
+    def fetch_blob(self, entry):
+        blob_path = os.path.join(self.cache_dir, "blobs", entry["sha"])
+        if os.path.exists(blob_path):
+            with self._lock:
+                self.blob_cache_hits += 1
+            with open(blob_path, 'r', encoding='utf-8') as f:
+                return f.read()
+
+        response = self.session.get(entry["url"], headers={"Accept": "application/vnd.github.raw"})
+        with self._lock:
+            self.requests_made += 1
+        response.raise_for_status()
+        response.encoding = 'utf-8'
+        content = response.text
+        tmp_path = blob_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, blob_path)
+        return content
+
+    def crawl(self, repo_url, exclude_folders=(), skip=()):
+        """Yield {"Path": ..., "Content": ...} for each wanted file, in path order, as downloads complete.
+
+        At most 2 * workers files are downloaded ahead of the consumer, so memory stays
+        bounded however large the repository is. Paths in skip are not fetched.
+        """
+        user, repo, branch, subpath = parse_repo_url(repo_url)
+        files = [f for f in self.list_files(user, repo, branch, subpath, exclude_folders) if f["path"] not in skip]
+        print(f"Found {len(files)} files to process.")
+
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for entry in files:
+                    pending.append((entry, pool.submit(self.fetch_blob, entry)))
+                    if len(pending) >= 2 * self.workers:
+                        entry, future = pending.popleft()
+                        yield {"Path": entry["path"], "Content": future.result()}
+                while pending:
+                    entry, future = pending.popleft()
+                    yield {"Path": entry["path"], "Content": future.result()}
+        finally:
+            self.save_etags()
+
+        print(f"Finished processing. Total files processed: {len(files)}. "
+              f"Requests: {self.requests_made} ({self.not_modified} not modified), "
+              f"cached blobs: {self.blob_cache_hits}.")
+
+    def save_etags(self):
+        with self._lock:
+            with open(self.etags_path, 'w', encoding='utf-8') as f:
+                json.dump(self.etags, f)
+
+
+class CrawlCheckpoint:
+    """Records each path written to the output CSV, with the CSV size after the write.
+
+    Resuming truncates the CSV back to the last recorded size, dropping any row that
+    was written after the last checkpoint, and skips the recorded paths.
+    """
+
+    def __init__(self, output_csv):
+        self.output_csv = output_csv
+        self.path = output_csv + ".checkpoint"
+        self.done = set()
+        self.resumed = False
+        last_size = 0
+        if os.path.exists(self.path) and os.path.exists(output_csv):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    path, _, size = line.rstrip('\n').rpartition('\t')
+                    if path:
+                        self.done.add(path)
+                        last_size = int(size)
+            with open(output_csv, 'r+b') as f:
+                f.truncate(last_size)
+            self.resumed = True
+            print(f"Resuming crawl: {len(self.done)} files already written to {output_csv}")
+        self._file = open(self.path, 'a' if self.resumed else 'w', encoding='utf-8')
+
+    def record(self, path, csv_size):
+        self._file.write(f"{path}\t{csv_size}\n")
+        self._file.flush()
+
+    def complete(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+def format_document(path, content):
+    """CSV cell for a crawled file, or None for an unsupported extension"""
+    extension = os.path.splitext(path)[1]
+
+    if extension == '.md':
+        return f"The following is a markdown document located at {path}\n------\n{content}\n------"
+    elif extension == '.mediawiki':
+        return f"The following is a mediawiki document located at {path}\n------\n{content}\n------"
+    return None
+
+
+def transform_and_write_csv(data, output_csv, checkpoint=None):
+    """Stream rows from data to the CSV, flushing and checkpointing after each one"""
+    mode = 'a' if checkpoint is not None and checkpoint.resumed else 'w'
+    with open(output_csv, mode=mode, newline='', encoding='utf-8') as outfile:
         writer = csv.writer(outfile)
         for row in data:
             path = row['Path']
-            content = row['Content']
-            extension = os.path.splitext(path)[1]
-
-            if extension == '.md':
-                formatted_content = f"The following is a markdown document located at {path}\n------\n{content}\n------"
-            elif extension == '.mediawiki':
-                formatted_content = f"The following is a mediawiki document located at {path}\n------\n{content}\n------"
-            else:
+            formatted_content = format_document(path, row['Content'])
+            if formatted_content is None:
                 continue  # Should not happen due to earlier filtering
 
             writer.writerow([formatted_content])
+            outfile.flush()
+            if checkpoint is not None:
+                checkpoint.record(path, os.fstat(outfile.fileno()).st_size)
 
 
 if __name__ == "__main__":
@@ -89,14 +231,19 @@ if __name__ == "__main__":
     parser.add_argument("repo_url", help="URL of the GitHub repository (e.g., https://github.com/user/repo/tree/branch)")
     parser.add_argument("output_path", help="Path to the output CSV file")
     parser.add_argument("--exclude", nargs='*', default=[], help="List of folder names to exclude")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent blob downloads")
+    parser.add_argument("--cache-dir", default=".github_cache", help="ETag and blob cache for re-crawls")
+    parser.add_argument("--api-url", default=GITHUB_API_URL, help="GitHub API base URL")
 
     args = parser.parse_args()
 
     try:
         print(f"Starting script for repository: {args.repo_url}")
-        contents = get_github_contents(args.repo_url)
-        paths = process_contents(contents, exclude_folders=args.exclude)
-        transform_and_write_csv(paths, args.output_path)
+        crawler = GitHubCrawler(api_url=args.api_url, cache_dir=args.cache_dir, workers=args.workers)
+        checkpoint = CrawlCheckpoint(args.output_path)
+        rows = crawler.crawl(args.repo_url, exclude_folders=args.exclude, skip=checkpoint.done)
+        transform_and_write_csv(rows, args.output_path, checkpoint)
+        checkpoint.complete()
         print(f"CSV file '{args.output_path}' generated successfully.")
     except requests.exceptions.HTTPError as e:
         print(f"HTTP Error occurred: {e}")
@@ -1,44 +1,341 @@
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
 import torch
+import transformers
 from transformers import AutoModelForCausalLM, AutoTokenizer, TextStreamer
-from peft import PeftModel, PeftConfig
-
-base_model = "meta-llama/Meta-Llama-3-8B-Instruct" 
-adapter_path = "checkpoint-375" 
-
-print("Loading base model...")
-tokenizer = AutoTokenizer.from_pretrained(base_model)
-model = AutoModelForCausalLM.from_pretrained(
-    base_model,
-    torch_dtype=torch.bfloat16,
-    device_map="auto"
-)
-
-# Load the LoRA adapter
-print("Loading LoRA adapter...")
-peft_config = PeftConfig.from_pretrained(adapter_path)
-model = PeftModel.from_pretrained(model, adapter_path)
-
-model.set_adapter("default")
-
-streamer = TextStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
-
-print("\nModel ready. Type your message below (type 'exit' to quit):")
-
-while True:
-    user_input = input("\nYou: ")
-    if user_input.lower() in {"exit", "quit"}:
-        print("Exiting...")
-        break
-
-    prompt = f"[INST] {user_input} [/INST]"
-
-    inputs = tokenizer(prompt, return_tensors="pt").to("cuda")
-    with torch.no_grad():
-        _ = model.generate(
-            **inputs,
-            max_new_tokens=256,
-            do_sample=True,
-            top_p=0.95,
-            temperature=0.7,
-            streamer=streamer
-        )
+from peft import PeftModel
+
+from serving import BatchingServer, JSONHandler, MicroBatcher, request_timeout
+
+logger = logging.getLogger(__name__)
+
+base_model = "meta-llama/Meta-Llama-3-8B-Instruct"
+adapter_path = "checkpoint-375"
+
+# Interactive REPL by default. With --serve the model is shared by concurrent HTTP requests:
+#   POST /generate  {"prompt": "...", "max_new_tokens": 256}  -> {"text": "...", "tokens": n}
+#   GET  /health
+#   GET  /stats     latency percentiles, batch sizes and decode throughput
+# Prompts that arrive together are decoded as one batch (or, with --continuous, join the
+# running batch at the next decode step). On a CPU-only box, --device cpu with a tiny model
+# (e.g. --base-model hf-internal-testing/tiny-random-LlamaForCausalLM --adapter "")
+# exercises the same path.
+
+
+def format_prompt(user_input: str) -> str:
+    return f"[INST] {user_input} [/INST]"
+
+
+def load_model(base_model: str, adapter_path: str | None, device: str = "auto", merge_lora: bool = False):
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    print("Loading base model...")
+    tokenizer = AutoTokenizer.from_pretrained(base_model)
+    # Batched prompts are left-padded so every row's next token is appended at the same position
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForCausalLM.from_pretrained(
+        base_model,
+        torch_dtype=torch.bfloat16 if device == "cuda" else torch.float32,
+        device_map="auto" if device == "cuda" else None
+    )
+
+    if adapter_path:
+        # Load the LoRA adapter
+        print("Loading LoRA adapter...")
+        model = PeftModel.from_pretrained(model, adapter_path)
+        model.set_adapter("default")
+        if merge_lora:
+            # Fold the adapter into the base weights, so decoding runs no extra LoRA matmuls
+            print("Merging LoRA weights into the base model...")
+            model = model.merge_and_unload()
+
+    model.eval()
+    return tokenizer, model
+
+
+def stop_token_ids(tokenizer, model) -> set:
+    """Token IDs that end an answer. Llama 3 ends a turn with <|eot_id|>, which only the
+    generation config lists as EOS; rows that finish early in a batch are filled with padding"""
+    eos = model.generation_config.eos_token_id
+    return ({tokenizer.eos_token_id, tokenizer.pad_token_id} | set(eos if isinstance(eos, list) else [eos])) - {None}
+
+
+def decode_answer(tokenizer, tokens, stop_ids, limit):
+    tokens = tokens[:limit]
+    end = next((i for i, token in enumerate(tokens) if token in stop_ids), len(tokens))
+    return tokenizer.decode(tokens[:end], skip_special_tokens=True), end
+
+
+class GenerationBatcher(MicroBatcher):
+    """Decodes prompts from concurrent requests together; see MicroBatcher for when a
+    batch goes out.
+
+    One worker thread owns the model and runs each batch through one generate call: a
+    single prefill for the padded batch, then one forward pass per decode step for every
+    row. Prompts that arrive while a batch is decoding go out together in the next one as
+    soon as it finishes.
+    """
+
+    item_name = "prompts"
+
+    def __init__(self, tokenizer, model, max_batch: int = 8, max_wait: float = 0.01,
+                 max_new_tokens: int = 256, **generate_kwargs):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_new_tokens = max_new_tokens
+        self.generate_kwargs = generate_kwargs
+        self._stop_ids = stop_token_ids(tokenizer, model)
+        self.generated_tokens = 0
+        self.decode_seconds = 0.0
+        super().__init__(max_batch, max_wait)
+
+    def submit(self, prompt: str, max_new_tokens: int | None = None) -> Future:
+        return super().submit((prompt, min(max_new_tokens or self.max_new_tokens, self.max_new_tokens)))
+
+    def _process(self, batch):
+        inputs = self.tokenizer([prompt for prompt, _ in batch], return_tensors="pt",
+                                padding=True).to(self.model.device)
+        # The batch decodes until its longest request is done; shorter ones are cut below
+        with torch.inference_mode():
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=max(limit for _, limit in batch),
+                use_cache=True,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **self.generate_kwargs
+            )
+        return [decode_answer(self.tokenizer, row, self._stop_ids, limit)
+                for row, (_, limit) in zip(output[:, inputs["input_ids"].shape[1]:].tolist(), batch)]
+
+    def _record(self, items, results, seconds):
+        super()._record(items, results, seconds)
+        self.generated_tokens += sum(tokens for _, tokens in results)
+        self.decode_seconds += seconds
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats["generated_tokens"] = self.generated_tokens
+            stats["tokens_per_second"] = self.generated_tokens / self.decode_seconds if self.decode_seconds else 0.0
+        return stats
+
+
+class ContinuousBatcher:
+    """Continuous batching through transformers' ContinuousBatchingManager (transformers
+    >= 4.56).
+
+    The KV cache is paged and the running batch is rebuilt at every decode step, so a new
+    prompt starts decoding alongside the ones in flight instead of waiting for them to
+    finish, and a finished one frees its slot immediately.
+    """
+
+    def __init__(self, tokenizer, model, max_new_tokens: int = 256, **generate_kwargs):
+        from transformers import GenerationConfig
+
+        if not hasattr(model, "init_continuous_batching"):
+            raise RuntimeError("continuous batching needs transformers >= 4.56 "
+                               f"(installed: {transformers.__version__}); upgrade it or drop --continuous")
+        self.tokenizer = tokenizer
+        self.max_new_tokens = max_new_tokens
+        self._stop_ids = stop_token_ids(tokenizer, model)
+        self.manager = model.init_continuous_batching(generation_config=GenerationConfig(
+            max_new_tokens=max_new_tokens,
+            eos_token_id=sorted(self._stop_ids),
+            pad_token_id=tokenizer.pad_token_id,
+            **generate_kwargs
+        ))
+        self.manager.start()
+        self._pending = {}  # request ID -> (token limit, future)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.prompts = 0
+        self.generated_tokens = 0
+        # Time with at least one request in flight; idle time would understate tokens/s
+        self.busy_seconds = 0.0
+        self._busy_since = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, prompt: str, max_new_tokens: int | None = None) -> Future:
+        limit = min(max_new_tokens or self.max_new_tokens, self.max_new_tokens)
+        future = Future()
+        with self._lock:
+            request_id = f"req-{self._next_id}"
+            self._next_id += 1
+            if not self._pending:
+                self._busy_since = time.perf_counter()
+            self._pending[request_id] = (limit, future)
+        future.add_done_callback(lambda f: self._cancelled(request_id) if f.cancelled() else None)
+        self.manager.add_request(self.tokenizer(prompt)["input_ids"], request_id=request_id, max_new_tokens=limit)
+        return future
+
+    def _pop(self, request_id):
+        """Remove a request from _pending; call with the lock held"""
+        entry = self._pending.pop(request_id, (None, None))
+        if entry[1] is not None and not self._pending:
+            self.busy_seconds += time.perf_counter() - self._busy_since
+        return entry
+
+    def _cancelled(self, request_id):
+        # A request that gives up (e.g. times out) stops decoding and frees its cache blocks
+        with self._lock:
+            self._pop(request_id)
+        self.manager.cancel_request(request_id)
+
+    def _run(self):
+        while True:
+            result = self.manager.get_result(timeout=0.5)
+            if result is None:
+                if not self.manager.is_running():
+                    self._fail_pending(RuntimeError("continuous batching stopped"))
+                    return
+                continue
+            with self._lock:
+                limit, future = self._pop(result.request_id)
+            if future is None or future.cancelled():
+                continue
+            if result.error:
+                future.set_exception(RuntimeError(result.error))
+                continue
+            text, tokens = decode_answer(self.tokenizer, result.generated_tokens, self._stop_ids, limit)
+            with self._lock:
+                self.prompts += 1
+                self.generated_tokens += tokens
+            future.set_result((text, tokens))
+
+    def _fail_pending(self, error):
+        with self._lock:
+            pending = dict(self._pending)
+            for request_id in pending:
+                self._pop(request_id)
+        for _, future in pending.values():
+            if not future.cancelled():
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            busy = self.busy_seconds + (time.perf_counter() - self._busy_since if self._pending else 0.0)
+            return {
+                "prompts": self.prompts,
+                "generated_tokens": self.generated_tokens,
+                "tokens_per_second": self.generated_tokens / busy if busy else 0.0,
+                "in_flight": len(self._pending),
+            }
+
+
+class InferenceHandler(JSONHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json({"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json({**self.server.stats(), "batcher": self.server.batcher.stats()})
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+            return
+        try:
+            body = self._read_json()
+            prompt = format_prompt(body["prompt"].strip())
+            max_new_tokens = int(body["max_new_tokens"]) if body.get("max_new_tokens") is not None else None
+            if max_new_tokens is not None and max_new_tokens < 1:
+                raise ValueError("max_new_tokens must be at least 1")
+            timeout = request_timeout(body, self.server.request_timeout)
+        except (ValueError, KeyError, AttributeError, TypeError):
+            self._send_json({"error": "expected a JSON object with a 'prompt' string, an optional 'max_new_tokens' "
+                                      "of at least 1 and an optional positive 'timeout' in seconds"}, status=400)
+            return
+
+        start = time.perf_counter()
+        future = self.server.batcher.submit(prompt, max_new_tokens)
+        try:
+            text, tokens = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.server.count_timeout()
+            self._send_json({"error": "request timed out"}, status=504)
+            return
+        except Exception as e:
+            logger.exception("Generation failed")
+            self._send_json({"error": str(e)}, status=500)
+            return
+        finally:
+            self.server.request_latency.record(time.perf_counter() - start)
+        self._send_json({"text": text.strip(), "tokens": tokens})
+
+
+def start_server(tokenizer, model, host="127.0.0.1", port=8001, max_batch=8, max_wait=0.01,
+                 max_new_tokens=256, request_timeout=300.0, continuous=False):
+    """Start the server in a background thread and return it; port 0 picks a free port"""
+    sampling = dict(do_sample=True, top_p=0.95, temperature=0.7)
+    if continuous:
+        batcher = ContinuousBatcher(tokenizer, model, max_new_tokens=max_new_tokens, **sampling)
+    else:
+        batcher = GenerationBatcher(tokenizer, model, max_batch=max_batch, max_wait=max_wait,
+                                    max_new_tokens=max_new_tokens, **sampling)
+    return BatchingServer((host, port), InferenceHandler, batcher, request_timeout).start()
+
+
+def chat_loop(tokenizer, model, max_new_tokens=256):
+    streamer = TextStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    print("\nModel ready. Type your message below (type 'exit' to quit):")
+
+    while True:
+        user_input = input("\nYou: ")
+        if user_input.lower() in {"exit", "quit"}:
+            print("Exiting...")
+            break
+
+        prompt = format_prompt(user_input)
+
+        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+        with torch.no_grad():
+            _ = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=True,
+                top_p=0.95,
+                temperature=0.7,
+                pad_token_id=tokenizer.pad_token_id,
+                streamer=streamer
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat with or serve the LoRA fine-tuned model.")
+    parser.add_argument("--base-model", default=base_model)
+    parser.add_argument("--adapter", default=adapter_path, help='LoRA adapter directory; "" for the base model alone')
+    parser.add_argument("--merge-lora", action="store_true", help="Merge the adapter into the base weights")
+    parser.add_argument("--device", choices=["auto", "cuda", "cpu"], default="auto")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--serve", action="store_true", help="Serve over HTTP instead of the interactive REPL")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--max-batch", type=int, default=8, help="Most prompts decoded together")
+    parser.add_argument("--max-wait", type=float, default=0.01, help="Seconds to wait for a batch to fill")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request deadline in seconds")
+    parser.add_argument("--continuous", action="store_true",
+                        help="Continuous batching with a paged KV cache (needs transformers >= 4.56)")
+    args = parser.parse_args()
+
+    tokenizer, model = load_model(args.base_model, args.adapter, args.device, args.merge_lora)
+    if not args.serve:
+        chat_loop(tokenizer, model, args.max_new_tokens)
+    else:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        server = start_server(tokenizer, model, args.host, args.port, args.max_batch, args.max_wait,
+                              args.max_new_tokens, args.timeout, args.continuous)
+        print(f"Inference server listening on http://{args.host}:{server.server_address[1]}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
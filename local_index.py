@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+
+# Embedded alternative to the Qdrant server for small corpora like the BIPs collection.
+# An index directory holds:
+#   vectors.npy   unit-normalized float32 or float16 matrix, memory-mapped on open
+#   points.jsonl  one {"id": ..., "payload": {...}} line per row
+#   ivf.npz       optional inverted-file index: k-means centroids and each list's row range
+# With an IVF index the rows are stored grouped by list, so probing a list scores one
+# contiguous slice of the matrix.
+
+SCORE_BLOCK_ROWS = 1024  # float16 rows are upcast to float32 this many at a time, to stay in cache
+
+
+@dataclass
+class LocalHit:
+    """Same fields client.py and ollama_client.py read from Qdrant's ScoredPoint"""
+    id: str
+    score: float
+    payload: Dict = field(default_factory=dict)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, sample: int = 50_000, seed: int = 0):
+    """Spherical k-means centroids and a list assignment for every row"""
+    rng = np.random.default_rng(seed)
+    train = vectors[rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)]
+    centroids = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(train @ centroids.T, axis=1)
+        for i in range(nlist):
+            members = train[assignment == i]
+            if len(members):
+                centroids[i] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    assignment = np.concatenate([np.argmax(vectors[i:i + SCORE_BLOCK_ROWS] @ centroids.T, axis=1)
+                                 for i in range(0, len(vectors), SCORE_BLOCK_ROWS)])
+    return centroids, assignment
+
+
+class LocalIndex:
+    def __init__(self, path: str, mmap: bool = True, nprobe: int | None = None):
+        self.path = path
+        self.nprobe = nprobe  # lists probed when search() is not given nprobe; None or 0 is exact
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None)
+        self.ids, self.payloads = [], []
+        with open(os.path.join(path, "points.jsonl"), 'r', encoding='utf-8') as f:
+            for line in f:
+                point = json.loads(line)
+                self.ids.append(point["id"])
+                self.payloads.append(point["payload"])
+        self.centroids = self.offsets = None
+        ivf_path = os.path.join(path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                self.centroids, self.offsets = ivf["centroids"], ivf["offsets"]
+
+    @classmethod
+    def build(cls, path: str, ids: List[str], vectors, payloads: List[Dict],
+              dtype: str = "float32", nlist: int = 0):
+        """Write an index directory and open it. nlist > 0 also builds an IVF index with that many
+        lists (at most one per row); vectors may have no rows, giving an index that finds nothing"""
+        os.makedirs(path, exist_ok=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            vectors = vectors.reshape(0, vectors.shape[1] if vectors.ndim == 2 else 0)
+        vectors = normalize_rows(vectors)
+        nlist = min(nlist, len(vectors))
+        order = np.arange(len(vectors))
+        ivf_path = os.path.join(path, "ivf.npz")
+        if nlist:
+            centroids, assignment = train_ivf(vectors, nlist)
+            order = np.argsort(assignment, kind="stable")
+            offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+            np.savez(ivf_path, centroids=centroids, offsets=offsets)
+        elif os.path.exists(ivf_path):
+            os.remove(ivf_path)
+
+        matrix = np.lib.format.open_memmap(os.path.join(path, "vectors.npy"), mode="w+",
+                                           dtype=np.dtype(dtype), shape=vectors.shape)
+        matrix[:] = vectors[order]
+        matrix.flush()
+        del matrix
+        with open(os.path.join(path, "points.jsonl"), 'w', encoding='utf-8') as f:
+            for i in order:
+                f.write(json.dumps({"id": str(ids[i]), "payload": payloads[i]}, ensure_ascii=False) + "\n")
+        return cls(path)
+
+    @classmethod
+    def from_qdrant(cls, qdrant, collection_name: str, path: str, dtype: str = "float32",
+                    nlist: int = 0, page_size: int = 1000):
+        """Export a Qdrant collection's vectors and payloads into a local index"""
+        ids, vectors, payloads = [], [], []
+        offset = None
+        while True:
+            points, offset = qdrant.scroll(collection_name=collection_name, limit=page_size, offset=offset,
+                                           with_payload=True, with_vectors=True)
+            for point in points:
+                ids.append(str(point.id))
+                vectors.append(point.vector)
+                payloads.append(point.payload)
+            if offset is None:
+                break
+        if not vectors:
+            # An empty export still needs the collection's dimension to check queries against
+            size = qdrant.get_collection(collection_name).config.params.vectors.size
+            return cls.build(path, ids, np.zeros((0, size), dtype=np.float32), payloads, dtype, nlist)
+        return cls.build(path, ids, np.asarray(vectors, dtype=np.float32), payloads, dtype, nlist)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if rows.dtype == np.float32:
+            return rows @ query
+        return np.concatenate([rows[i:i + SCORE_BLOCK_ROWS].astype(np.float32) @ query
+                               for i in range(0, len(rows), SCORE_BLOCK_ROWS)])
+
+    def search_rows(self, query_vector, top_k: int = 3, nprobe: int | None = None):
+        """(row indices, cosine scores) of the top_k rows, best first.
+
+        With an IVF index only the nprobe lists closest to the query are scored;
+        nprobe=None or no IVF index means an exact search over every row.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        if query.shape != (self.vectors.shape[1],):
+            raise ValueError(f"Query has shape {query.shape}; the index at {self.path} holds "
+                             f"{self.vectors.shape[1]}-dimensional vectors")
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if self.centroids is not None and nprobe:
+            lists = np.argsort(-(self.centroids @ query))[:nprobe]
+            rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+            # Each list is a contiguous slice, so probing never gathers scattered rows
+            scores = np.concatenate([self._scores(self.vectors[self.offsets[i]:self.offsets[i + 1]], query)
+                                     for i in lists])
+        else:
+            rows = None
+            scores = self._scores(self.vectors, query)
+
+        k = min(top_k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return (rows[top] if rows is not None else top), scores[top]
+
+    def search(self, query_vector, top_k: int = 3, nprobe: int | None = None) -> List[LocalHit]:
+        rows, scores = self.search_rows(query_vector, top_k, self.nprobe if nprobe is None else nprobe)
+        return [LocalHit(self.ids[row], float(score), self.payloads[row]) for row, score in zip(rows, scores)]
+
+
+def from_env():
+    """The export at LOCAL_INDEX_PATH, probing LOCAL_INDEX_NPROBE IVF lists per search, or None"""
+    if not os.getenv("LOCAL_INDEX_PATH"):
+        return None
+    return LocalIndex(os.getenv("LOCAL_INDEX_PATH"),
+                      nprobe=int(os.getenv("LOCAL_INDEX_NPROBE")) if os.getenv("LOCAL_INDEX_NPROBE") else None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a Qdrant collection into an embedded local index.")
+    parser.add_argument("out", help="Index directory, e.g. bips_index")
+    parser.add_argument("--collection", default="my_collection")
+    parser.add_argument("--qdrant-url", default="http://localhost:6333")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 for exact search only)")
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    from semantic_cache import bump_index_version
+    start = time.perf_counter()
+    index = LocalIndex.from_qdrant(QdrantClient(url=args.qdrant_url, timeout=60.0), args.collection,
+                                   args.out, args.dtype, args.nlist)
+    # Answers and rerank scores cached against the old index are stale now
+    bump_index_version()
+    print(f"Exported {len(index)} points from {args.collection} to {args.out} in {time.perf_counter() - start:.1f}s")
+    print(f"Set LOCAL_INDEX_PATH={args.out} to search it from client.py and ollama_client.py")
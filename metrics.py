@@ -0,0 +1,31 @@
+import threading
+from collections import deque
+
+
+class LatencyRecorder:
+    """Keeps the most recent latency samples (seconds) and reports percentiles over them"""
+
+    def __init__(self, name: str, maxlen: int = 10000):
+        self.name = name
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, p: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))
+        return samples[index]
+
+    def summary(self) -> str:
+        if not self.count:
+            return f"{self.name}: no samples"
+        return (f"{self.name}: {self.count} samples, p50 {1000 * self.percentile(50):.0f} ms, "
+                f"p99 {1000 * self.percentile(99):.0f} ms")
@@ -1,77 +1,202 @@
 import os
+import time
 import uuid
 import asyncio
-from typing import List
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
+import logging
+from typing import AsyncIterator, List
+from qdrant_client import AsyncQdrantClient
 from llama_index.llms.ollama import Ollama
 from llama_index.core.llms import ChatMessage
 import ollama  
-
-qdrant = QdrantClient(host="localhost", port=6333)
+from embedding_cache import from_env as embedding_cache_from_env
+from semantic_cache import from_env as answer_cache_from_env
+from metrics import LatencyRecorder
+from context_packer import from_env as packer_from_env
+from local_index import from_env as local_index_from_env
+from content_store import resolve_sources
+from bm25_index import from_env as bm25_index_from_env
+from retrieval import fuse_points
+from qdrant_settings import SEARCH_PARAMS
+import reranker as rerank
+
+logger = logging.getLogger(__name__)
+
+# One async client of each kind, shared by every request so connections are pooled
+# and no call blocks the event loop
+qdrant = AsyncQdrantClient(host="localhost", port=6333)
+ollama_async = ollama.AsyncClient()
 COLLECTION_NAME = "my_collection"
 VECTOR_SIZE = 768  
+EMBEDDING_MODEL = "nomic-embed-text"
+CHAT_MODEL = "llama3.1"
 
 llm = Ollama(model="llama3.1", request_timeout=360.0)
 
+# Repeat questions skip the embedding round trip (see embedding_cache.from_env)
+embedding_cache = embedding_cache_from_env()
 
-def get_embedding(text: str) -> List[float]:
-    response = ollama.embeddings(
-        model="nomic-embed-text",
-        prompt=text
-    )
-    return response["embedding"]
+# Near-identical questions that retrieve the same points reuse the earlier answer.
+# Cleared automatically when qdrant_vector_db re-indexes the collection.
+answer_cache = answer_cache_from_env()
+
+# Retrieved documents are cut down to their most relevant passages within a context
+# token budget rather than pasted whole into the prompt.
+packer = packer_from_env()
+
+# Set when LOCAL_INDEX_PATH names a local_index.py export: search in-process instead of
+# on the Qdrant server
+local_index = local_index_from_env()
+
+# Set when qdrant_vector_db has built a BM25 index: exact-term matches from it are fused
+# with the dense results
+bm25_index = bm25_index_from_env()
 
+# Set RERANK_MODEL (see reranker.py) to retrieve RERANK_CANDIDATES candidates and keep
+# only the top_k a cross-encoder ranks highest, instead of the top_k nearest neighbours
+reranker = rerank.from_env()
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
 
-def search_qdrant(query: str, top_k: int = 3) -> List[str]:
-    embedding = get_embedding(query)
+# Time from receiving a question to yielding the first token of its answer
+ttft = LatencyRecorder("Time to first token")
 
-    search_result = qdrant.search(
+
+async def get_embedding(text: str) -> List[float]:
+    async def embed():
+        response = await ollama_async.embeddings(
+            model=EMBEDDING_MODEL,
+            prompt=text
+        )
+        return response["embedding"]
+
+    return await embedding_cache.aget_or_compute(text, EMBEDDING_MODEL, embed)
+
+
+async def search_qdrant_hits(embedding: List[float], top_k: int = 3):
+    if local_index is not None:
+        return local_index.search(embedding, top_k)
+    return await qdrant.search(
         collection_name=COLLECTION_NAME,
         query_vector=embedding,
-        limit=top_k
+        limit=top_k,
+        search_params=SEARCH_PARAMS
     )
 
-    return [hit.payload["source"] for hit in search_result]
+
+async def search_hits(query: str, embedding: List[float], top_k: int = 3):
+    """Dense search, run alongside a BM25 lookup and fused with it when a BM25 index is available"""
+    if bm25_index is None:
+        return await search_qdrant_hits(embedding, top_k)
+    dense, lexical = await asyncio.gather(
+        search_qdrant_hits(embedding, top_k),
+        asyncio.to_thread(bm25_index.search, query, top_k)
+    )
+    return fuse_points([dense, lexical])[:top_k]
 
 
-async def generate_response(user_input: str) -> str:
-    context_chunks = search_qdrant(user_input, top_k=3)
-    context = "\n---\n".join(context_chunks)
+async def rerank_hits(query: str, hits, top_k: int):
+    """The top_k hits by cross-encoder score; scoring runs in a worker thread"""
+    if reranker is None:
+        return hits[:top_k]
+    sources = resolve_sources([hit.payload for hit in hits])
+    order = await asyncio.to_thread(
+        reranker.rerank, query, [str(hit.id) for hit in hits],
+        [rerank.passage(source, hit.payload.get("summary")) for hit, source in zip(hits, sources)], top_k
+    )
+    return [hits[i] for i in order]
+
+
+async def search_qdrant(query: str, top_k: int = 3) -> List[str]:
+    embedding = await get_embedding(query)
+    search_result = await search_hits(query, embedding, top_k)
+    return resolve_sources([hit.payload for hit in search_result])
+
+
+async def stream_response(user_input: str) -> AsyncIterator[str]:
+    start = time.perf_counter()
+    embedding = await get_embedding(user_input)
+    hits = await search_hits(user_input, embedding, top_k=max(3, RERANK_CANDIDATES) if reranker is not None else 3)
+    hits = await rerank_hits(user_input, hits, top_k=3)
+    point_ids = [str(hit.id) for hit in hits]
+    cached = answer_cache.lookup(embedding, point_ids)
+    if cached is not None:
+        ttft.record(time.perf_counter() - start)
+        yield cached
+        return
+
+    sources = resolve_sources([hit.payload for hit in hits])
+    context = packer.pack(
+        user_input,
+        [{"text": source, "summary": hit.payload.get("summary")} for hit, source in zip(hits, sources)]
+    )
 
     system_prompt = (
         "You are an expert assistant. Use the following context to answer the user's question as accurately as possible.\n\n"
-        f"{context}"
+        f"{context.text}"
     )
+    # Estimated here, replaced by the model's own count when it reports one
+    prompt_tokens = packer.count_tokens(system_prompt) + packer.count_tokens(user_input)
 
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_input}
     ]
 
-    response = ollama.chat(
-        model="llama3.1",
-        messages=messages
-    )
+    parts = []
+    async for chunk in await ollama_async.chat(
+        model=CHAT_MODEL,
+        messages=messages,
+        stream=True
+    ):
+        if chunk.get('prompt_eval_count'):
+            prompt_tokens = chunk['prompt_eval_count']
+        delta = chunk['message']['content']
+        if not delta:
+            continue
+        if not parts:
+            first_token = time.perf_counter() - start
+            ttft.record(first_token)
+            logger.info("Time to first token: %.3fs", first_token)
+        parts.append(delta)
+        yield delta
+
+    logger.info("Prompt tokens: %d (context %d, %d before packing)",
+                prompt_tokens, context.tokens, context.unpacked_tokens)
+    answer = "".join(parts).strip()
+    if answer:  # an empty stream is a failed answer, not one to replay
+        answer_cache.store(embedding, point_ids, answer)
 
-    return response['message']['content'].strip()
+
+async def generate_response(user_input: str) -> str:
+    return "".join([token async for token in stream_response(user_input)]).strip()
 
 async def chat_loop():
     print("🤖 RAG Chatbot (LLaMA 3.1 + Ollama Embeddings) is ready. Type your question or 'exit' to quit.\n")
 
     while True:
-        query = input("You: ").strip()
+        query = (await asyncio.to_thread(input, "You: ")).strip()
         if query.lower() in {"exit", "quit"}:
+            print(embedding_cache.summary())
+            print(answer_cache.summary())
+            print(ttft.summary())
+            print(packer.summary())
+            if reranker is not None:
+                print(reranker.summary())
             print("👋 Goodbye!")
             break
         if not query:
             continue
 
         try:
-            answer = await generate_response(query)
-            print(f"🤖 Bot: {answer}\n")
+            print("🤖 Bot: ", end="", flush=True)
+            async for token in stream_response(query):
+                print(token, end="", flush=True)
+            print("\n")
         except Exception as e:
             print(f"❌ Error: {e}\n")
 
 if __name__ == "__main__":
+    # Per-answer time to first token and prompt token counts are logged at INFO
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per HTTP request otherwise
     asyncio.run(chat_loop())
+
@@ -0,0 +1,150 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+
+import split
+from github_parser import format_document
+
+# Preprocessing for local corpora (a BIPs clone, mailing list or StackExchange dumps).
+# Files are sharded across a process pool; each worker normalizes, formats, chunks and
+# hashes one file, and results are merged back in sorted path order so the output is
+# identical whatever the worker count.
+
+DEFAULT_EXTENSIONS = ['.md', '.mediawiki', '.txt']
+STAGES = ["read", "normalize", "format", "chunk", "hash"]
+
+_chunker = None
+
+
+def _init_worker(max_tokens, overlap, tokenizer):
+    global _chunker
+    _chunker = split.Chunker(max_tokens, overlap, split.load_token_counter(tokenizer))
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return re.sub(r'\n{3,}', "\n\n", text).strip() + "\n"
+
+
+def format_any_document(path, content):
+    return (format_document(path, content)
+            or f"The following is a text document located at {path}\n------\n{content}\n------")
+
+
+def process_file(job):
+    """Run every stage for one (root, path) and return (document, chunks, stage timings)"""
+    root, path = job
+    timings = {}
+
+    start = time.perf_counter()
+    with open(os.path.join(root, path), 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    timings["read"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normalized = normalize(text)
+    timings["normalize"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    document = format_any_document(path, normalized)
+    timings["format"] = time.perf_counter() - start
+
+    # Chunked as read, like split.Chunker.chunk_file, so chunk offsets point into the source file
+    start = time.perf_counter()
+    chunks = [asdict(chunk) for chunk in _chunker.chunk_stream(io.StringIO(text), path)]
+    timings["chunk"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chunk in chunks:
+        chunk["id"] = hashlib.sha256(f"{chunk['source']}\x1f{chunk['text']}".encode("utf-8")).hexdigest()
+    doc_hash = hashlib.sha256(document.encode("utf-8")).hexdigest()
+    timings["hash"] = time.perf_counter() - start
+
+    return {"path": path, "hash": doc_hash, "content": document}, chunks, timings
+
+
+def collect_files(inputs, extensions):
+    """(root, relative path) for every matching file, sorted so merges are deterministic"""
+    jobs = []
+    for item in inputs:
+        if os.path.isfile(item):
+            jobs.append((os.path.dirname(item), os.path.basename(item)))
+            continue
+        for dirpath, dirnames, filenames in os.walk(item):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in filenames:
+                if os.path.splitext(name)[1] in extensions:
+                    jobs.append((item, os.path.relpath(os.path.join(dirpath, name), item).replace(os.sep, '/')))
+    return sorted(jobs, key=lambda job: job[1])
+
+
+def preprocess(inputs, chunks_out, docs_out=None, workers=None, extensions=DEFAULT_EXTENSIONS,
+               max_tokens=256, overlap=32, tokenizer=""):
+    jobs = collect_files(inputs, extensions)
+    print(f"Preprocessing {len(jobs)} files with {workers or os.cpu_count()} workers")
+
+    totals = defaultdict(float)
+    documents = 0
+    chunk_count = 0
+    seen_docs = set()
+    start = time.perf_counter()
+
+    docs_file = open(docs_out, 'w', newline='', encoding='utf-8') if docs_out else None
+    try:
+        with open(chunks_out, 'w', encoding='utf-8') as chunks_file, \
+             ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(max_tokens, overlap, tokenizer)) as pool:
+            docs_writer = csv.writer(docs_file) if docs_file else None
+            chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+            # map yields in submission order, which is what keeps the merge deterministic
+            for document, chunks, timings in pool.map(process_file, jobs, chunksize=chunksize):
+                for stage, seconds in timings.items():
+                    totals[stage] += seconds
+                if document["hash"] in seen_docs:
+                    continue  # identical file reached through two inputs
+                seen_docs.add(document["hash"])
+                documents += 1
+
+                merge_start = time.perf_counter()
+                if docs_writer:
+                    docs_writer.writerow([document["content"]])
+                for chunk in chunks:
+                    chunks_file.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                chunk_count += len(chunks)
+                totals["merge"] += time.perf_counter() - merge_start
+    finally:
+        if docs_file:
+            docs_file.close()
+
+    wall = time.perf_counter() - start
+    print(f"Wrote {chunk_count} chunks from {documents} documents to {chunks_out} in {wall:.2f}s")
+    print("Stage timings (summed over workers):")
+    for stage in STAGES + ["merge"]:
+        print(f"  {stage:<10} {totals[stage]:8.2f}s")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize, format, chunk and hash local corpora in parallel.")
+    parser.add_argument("inputs", nargs="+", help="Files or directories (e.g. a local clone of the BIPs repo)")
+    parser.add_argument("--chunks-out", default="chunks.jsonl", help="Chunks as JSON lines")
+    parser.add_argument("--docs-out", help="Optional github_parser-style CSV of formatted documents for data_augment.py")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--extensions", nargs="*", default=DEFAULT_EXTENSIONS)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--tokenizer", default=split.DEFAULT_TOKENIZER, help="'' for approximate token counts")
+    args = parser.parse_args()
+
+    preprocess(args.inputs, args.chunks_out, args.docs_out, args.workers, args.extensions,
+               args.max_tokens, args.overlap, args.tokenizer)
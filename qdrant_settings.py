@@ -0,0 +1,22 @@
+from qdrant_client.http import models
+
+# Vector storage settings shared by the ingest script (qdrant_vector_db.py) and the bots,
+# kept apart so the bots don't import the ingest pipeline and its dependencies.
+
+
+def quantization_config(kind: str):
+    """Quantized vectors stay in RAM for search while the full-precision originals live
+    on disk and are only read to rescore the top candidates"""
+    if kind == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if kind == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+# Search the quantized vectors, then rescore twice top_k candidates with the originals
+SEARCH_PARAMS = models.SearchParams(
+    quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
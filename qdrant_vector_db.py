@@ -1,11 +1,21 @@
-import pandas as pd
+import csv
 import uuid
+import hashlib
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from openai import OpenAI
 import os
+import json
+import time
+import queue
+import argparse
+import threading
 import ollama 
 from tqdm import tqdm
+from semantic_cache import bump_index_version
+from content_store import ContentStore, content_id
+from bm25_index import BM25Index
+from qdrant_settings import quantization_config
 
 
 # Set your OpenAI API key for using OpenAI for embedding generation
@@ -17,17 +27,36 @@ qdrant = QdrantClient(host="localhost", port=6333, timeout=60.0)  # increase tim
 collection_name = "my_collection"
 vector_size = 768 #1536 for OpenAI
 
-# Step 1: Create Qdrant collection
-def create_collection(name: str, vector_size: int):
+# Document bodies go to a content store and points only carry their ID; None keeps
+# the full body in every payload as before
+content_store = None
+# Lexical index kept in step with the collection for hybrid search; None skips it
+bm25_index = None
+
+def bm25_text(full: str, summary: str) -> str:
+    return f"{summary}\n{full}"
+
+csv.field_size_limit(10**9)
+
+# Step 1: Create Qdrant collection, quantized as set out in qdrant_settings.py
+def create_collection(name: str, vector_size: int, quantization: str = "scalar", on_disk: bool = True):
     existing = qdrant.get_collections().collections
     if name not in [c.name for c in existing]:
         qdrant.create_collection(
             collection_name=name,
-            vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE)
+            vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE, on_disk=on_disk),
+            quantization_config=quantization_config(quantization),
+            on_disk_payload=True
         )
-        print(f"Created collection: {name}")
+        print(f"Created collection: {name} (quantization: {quantization}, vectors on disk: {on_disk})")
     else:
-        print(f"Collection '{name}' already exists")
+        # Storage settings can change in place; Qdrant rebuilds the segments in the background
+        qdrant.update_collection(
+            collection_name=name,
+            vectors_config={"": models.VectorParamsDiff(on_disk=on_disk)},
+            quantization_config=quantization_config(quantization) or models.Disabled.DISABLED
+        )
+        print(f"Collection '{name}' already exists; set quantization: {quantization}, vectors on disk: {on_disk}")
 
 # Step 2: Get embedding from summary (Uncomment for OpenAI models)
 
@@ -38,6 +67,14 @@ def create_collection(name: str, vector_size: int):
 #         encoding_format="float"
 #     )
 #     return response.data[0].embedding
+#
+# def get_embeddings(texts: list[str]) -> list[list[float]]:
+#     response = client.embeddings.create(
+#         model="text-embedding-3-small",
+#         input=texts,
+#         encoding_format="float"
+#     )
+#     return [item.embedding for item in response.data]
 
 def get_embedding(text: str) -> list[float]:
     response = ollama.embeddings(
@@ -46,33 +83,312 @@ def get_embedding(text: str) -> list[float]:
     )
     return response['embedding']
 
-# Step 3: Read CSV and insert into Qdrant
-def insert_from_csv(csv_file: str, batch_size: int = 32):
-    df = pd.read_csv(csv_file)
-    total = len(df)
-    for i in tqdm(range(0, total, batch_size), desc="Inserting in batches"):
-        batch = df.iloc[i:i+batch_size]
-        points = []
-        for _, row in batch.iterrows():
-            full = row[0]
-            summary = row[1]
-            embedding = get_embedding(summary)
-            payload = {
-                "source": full,
-                "summary": summary
-            }
-
-            points.append(models.PointStruct(
-                id=str(uuid.uuid4()),
-                vector=embedding,
-                payload=payload
-            ))
+# One request per batch instead of one per row
+def get_embeddings(texts: list[str]) -> list[list[float]]:
+    response = ollama.embed(
+        model='nomic-embed-text',
+        input=texts
+    )
+    return response['embeddings']
+
+# Step 3: Point IDs are derived from the row content, so re-running the ingest over an
+# unchanged CSV maps every row onto the point it already has
+def point_id(source: str, summary: str) -> str:
+    digest = hashlib.sha256(f"{source}\x1f{summary}".encode("utf-8")).digest()
+    return str(uuid.UUID(bytes=digest[:16]))
+
+def existing_point_ids(name: str, page_size: int = 1000) -> set[str]:
+    ids = set()
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=name,
+            limit=page_size,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False
+        )
+        ids.update(str(p.id) for p in points)
+        if offset is None:
+            return ids
+
+def delete_points(name: str, ids: list[str], batch_size: int = 1000):
+    for i in range(0, len(ids), batch_size):
+        qdrant.delete(
+            collection_name=name,
+            points_selector=models.PointIdsList(points=ids[i:i+batch_size])
+        )
+
+# Step 4: Pipeline batches through an embedding stage and an upsert stage.
+# Bounded queues between the stages give backpressure, so the CSV is never read
+# further ahead than the embedders and Qdrant can absorb.
+def with_retries(fn, attempts: int = 3, backoff: float = 2.0):
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt == attempts:
+                raise
+            time.sleep(backoff * attempt)
+
+class DeadLetterWriter:
+    """Appends failed batches as JSON lines so they can be replayed with retry_failed_batches"""
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write(self, stage: str, start: int, sources: list, summaries: list, error: Exception):
+        record = {
+            "stage": stage,
+            "batch_start": start,
+            "error": str(error),
+            "rows": [[full, summary] for full, summary in zip(sources, summaries)],
+        }
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.count += 1
+        print(f"Failed batch {start}–{start + len(sources)} at {stage}: {error}")
+
+def ingest_batches(batches, total: int | None, embed_workers: int = 2, upsert_workers: int = 1,
+                   queue_size: int = 4, dead_letter_file: str = "failed_batches.jsonl"):
+    """Embed and upsert (start, sources, summaries) batches concurrently.
 
+    Returns the number of rows upserted and the number of batches that failed and were
+    written to the dead-letter file."""
+    embed_queue = queue.Queue(maxsize=queue_size)
+    upsert_queue = queue.Queue(maxsize=queue_size)
+    dead_letters = DeadLetterWriter(dead_letter_file)
+    progress = tqdm(total=total, desc="Inserting in batches")
+    progress_lock = threading.Lock()
+    inserted = 0
+    # Rows go to the BM25 index in large groups: each add rewrites the postings of every term it touches.
+    # Kept per batch, so a failed add dead-letters the batches it held.
+    bm25_pending = []  # (start, sources, summaries, rows)
+
+    def flush_bm25(force: bool = False):
+        with progress_lock:
+            if not bm25_pending or (sum(len(b[3]) for b in bm25_pending) < 1000 and not force):
+                return
+            pending = bm25_pending[:]
+            bm25_pending.clear()
         try:
-            qdrant.upsert(collection_name=collection_name, points=points)
+            bm25_index.add_many([row for _, _, _, rows in pending for row in rows])
         except Exception as e:
-            print(f"Failed batch {i}–{i+batch_size}: {e}")
+            # The points are in Qdrant already; replaying the batches upserts them again unchanged
+            for start, sources, summaries, _ in pending:
+                dead_letters.write("bm25", start, sources, summaries, e)
+
+    def embed_stage():
+        while True:
+            item = embed_queue.get()
+            if item is None:
+                return
+            start, sources, summaries = item
+            # Anything that fails here dead-letters the batch; a dead worker would leave the
+            # reader blocked on the full embed queue
+            try:
+                embeddings = with_retries(lambda: get_embeddings(summaries))
+                if content_store is not None:
+                    source_payloads = [{"source_id": i} for i in content_store.put_many(sources)]
+                else:
+                    source_payloads = [{"source": full} for full in sources]
+                points = [
+                    models.PointStruct(
+                        id=point_id(full, summary),
+                        vector=embedding,
+                        payload={
+                            **source_payload,
+                            "summary": summary
+                        }
+                    )
+                    for full, summary, embedding, source_payload in zip(sources, summaries, embeddings, source_payloads)
+                ]
+            except Exception as e:
+                dead_letters.write("embed", start, sources, summaries, e)
+                continue
+            upsert_queue.put((start, sources, summaries, points))
+
+    def upsert_stage():
+        nonlocal inserted
+        while True:
+            item = upsert_queue.get()
+            if item is None:
+                return
+            start, sources, summaries, points = item
+            try:
+                with_retries(lambda: qdrant.upsert(collection_name=collection_name, points=points))
+            except Exception as e:
+                dead_letters.write("upsert", start, sources, summaries, e)
+                continue
+            if bm25_index is not None:
+                rows = [(point.id, bm25_text(full, summary), point.payload)
+                        for point, full, summary in zip(points, sources, summaries)]
+                with progress_lock:
+                    bm25_pending.append((start, sources, summaries, rows))
+                flush_bm25()
+            with progress_lock:
+                inserted += len(points)
+                progress.update(len(points))
+
+    embedders = [threading.Thread(target=embed_stage, daemon=True) for _ in range(embed_workers)]
+    upserters = [threading.Thread(target=upsert_stage, daemon=True) for _ in range(upsert_workers)]
+    for t in embedders + upserters:
+        t.start()
+
+    for batch in batches:
+        embed_queue.put(batch)
+    for _ in embedders:
+        embed_queue.put(None)
+    for t in embedders:
+        t.join()
+    for _ in upserters:
+        upsert_queue.put(None)
+    for t in upserters:
+        t.join()
+    if bm25_index is not None:
+        flush_bm25(force=True)
+    progress.close()
+
+    if dead_letters.count:
+        print(f"{dead_letters.count} failed batches written to {dead_letter_file}")
+    return inserted, dead_letters.count
+
+# Step 5: Read CSV and sync it into Qdrant. Only rows whose content is not already
+# in the collection are embedded; points for rows no longer in the CSV are deleted.
+# The CSV is streamed, so memory stays flat however large the file is; only the
+# set of point IDs grows with the row count.
+def iter_csv_rows(csv_file: str):
+    with open(csv_file, 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2:
+                yield row[0], row[1]
 
+def insert_from_csv(csv_file: str, batch_size: int = 32, incremental: bool = True, **pipeline_options):
+    existing = existing_point_ids(collection_name) if incremental else set()
+    seen = set()
+    live_sources = set()
+    unchanged = 0
+    unindexed = []  # unchanged rows the BM25 index does not have yet
 
-create_collection(collection_name, vector_size)
-insert_from_csv("/home/staru/Desktop/Bitcoin_Bips_bot/data/bips_augmented.csv") 
+    def new_batches():
+        nonlocal unchanged
+        sources, summaries = [], []
+        start = 0
+        for full, summary in iter_csv_rows(csv_file):
+            pid = point_id(full, summary)
+            if pid in seen:
+                continue
+            seen.add(pid)
+            if content_store is not None:
+                live_sources.add(content_id(full))
+            if pid in existing:
+                unchanged += 1
+                if bm25_index is not None and pid not in bm25_index:
+                    unindexed.append((pid, full, summary))
+                continue
+            sources.append(full)
+            summaries.append(summary)
+            if len(sources) == batch_size:
+                yield start, sources, summaries
+                start += batch_size
+                sources, summaries = [], []
+        if sources:
+            yield start, sources, summaries
+
+    start = time.perf_counter()
+    inserted, failed = ingest_batches(new_batches(), None, **pipeline_options)
+    elapsed = time.perf_counter() - start
+
+    stale = sorted(existing - seen)
+    print(f"{len(seen)} rows in CSV: {len(seen) - unchanged} new or changed, "
+          f"{unchanged} unchanged, {len(stale)} to delete")
+    print(f"Inserted {inserted} rows in {elapsed:.1f}s ({inserted / elapsed if elapsed else 0:.1f} rows/sec)")
+    if failed:
+        # An edited row's old point is stale as soon as its new ID is seen, even if the new
+        # point never made it in; keep everything until the failed batches are replayed
+        print(f"Partial sync: {failed} batches failed, so {len(stale)} stale points are kept. "
+              f"Rerun the sync to retry the failed rows and delete them")
+        stale = []
+
+    if stale:
+        delete_points(collection_name, stale)
+        print(f"Deleted {len(stale)} points no longer in the CSV")
+    if bm25_index is not None:
+        if stale:
+            bm25_index.delete(stale)
+        if unindexed:
+            backfill_bm25(unindexed)
+        print(f"BM25 index: {bm25_index.stats()}")
+    if content_store is not None and not failed:
+        removed = content_store.retain(live_sources)
+        if removed:
+            print(f"Removed {removed} documents no longer referenced from {content_store.path}")
+
+    if inserted or stale:
+        bump_index_version()  # drops answers cached by running bots
+
+def backfill_bm25(rows, batch_size: int = 1000):
+    """Index rows that are already in Qdrant (e.g. ingested before the BM25 index existed)"""
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        points = qdrant.retrieve(collection_name=collection_name, ids=[pid for pid, _, _ in batch], with_payload=True)
+        payloads = {str(point.id): point.payload for point in points}
+        bm25_index.add_many([(pid, bm25_text(full, summary), payloads.get(pid, {"source": full, "summary": summary}))
+                             for pid, full, summary in batch])
+    print(f"Added {len(rows)} existing points to the BM25 index")
+
+def retry_failed_batches(dead_letter_file: str, **pipeline_options):
+    """Replay a dead-letter file; batches that fail again go to a fresh .retry file"""
+    with open(dead_letter_file, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    batches = [
+        (record["batch_start"], [row[0] for row in record["rows"]], [row[1] for row in record["rows"]])
+        for record in records
+    ]
+    total = sum(len(sources) for _, sources, _ in batches)
+    pipeline_options.setdefault("dead_letter_file", dead_letter_file + ".retry")
+    inserted, _ = ingest_batches(batches, total, **pipeline_options)
+    print(f"Re-inserted {inserted} of {total} rows from {dead_letter_file}")
+    if inserted:
+        bump_index_version()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed an augmented CSV and insert it into Qdrant.")
+    parser.add_argument("csv_file", nargs="?", default="/home/staru/Desktop/Bitcoin_Bips_bot/data/bips_augmented.csv")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--embed-workers", type=int, default=2)
+    parser.add_argument("--upsert-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=4, help="Batches buffered between stages")
+    parser.add_argument("--dead-letter-file", default="failed_batches.jsonl")
+    parser.add_argument("--retry-failed", action="store_true", help="Replay --dead-letter-file instead of reading the CSV")
+    parser.add_argument("--full", action="store_true", help="Re-embed every row instead of only new or changed ones")
+    parser.add_argument("--quantization", choices=["scalar", "binary", "none"], default="scalar")
+    parser.add_argument("--vectors-in-ram", action="store_true",
+                        help="Keep full-precision vectors in RAM instead of on disk")
+    parser.add_argument("--content-store", default=os.getenv("CONTENT_STORE_PATH", "bips_content.sqlite"),
+                        help="SQLite file for document bodies referenced by points")
+    parser.add_argument("--inline-source", action="store_true",
+                        help="Store each document body in its point payload instead of the content store")
+    parser.add_argument("--bm25-index", default=os.getenv("BM25_INDEX_PATH", "bips_bm25.sqlite"),
+                        help="SQLite file for the BM25 index used by hybrid search")
+    parser.add_argument("--no-bm25", action="store_true", help="Don't maintain the BM25 index")
+    args = parser.parse_args()
+
+    pipeline_options = {
+        "embed_workers": args.embed_workers,
+        "upsert_workers": args.upsert_workers,
+        "queue_size": args.queue_size,
+    }
+    if not args.inline_source:
+        content_store = ContentStore(args.content_store)
+    if not args.no_bm25:
+        bm25_index = BM25Index(args.bm25_index)
+    create_collection(collection_name, vector_size, args.quantization, on_disk=not args.vectors_in_ram)
+    if args.retry_failed:
+        retry_failed_batches(args.dead_letter_file, **pipeline_options)
+    else:
+        insert_from_csv(args.csv_file, args.batch_size, incremental=not args.full,
+                        dead_letter_file=args.dead_letter_file, **pipeline_options)
@@ -0,0 +1,218 @@
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+from embedding_cache import normalize_query
+from metrics import LatencyRecorder
+from semantic_cache import INDEX_VERSION_FILE, read_index_version
+from sqlite_cache import SQLiteCache
+
+# Cross-encoder reranking of a wider candidate set, so the bots can retrieve e.g. 20
+# candidates and still put only the best 3 in the prompt. Runs on CPU: a small MS MARCO
+# cross-encoder through PyTorch (optionally int8 dynamically quantized) or ONNX Runtime.
+DEFAULT_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# int8 export shipped with the sentence-transformers cross-encoders; runs on any AVX2 CPU
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+def load_cross_encoder(model_name: str = DEFAULT_MODEL, backend: str = "torch", int8: bool = False,
+                       max_length: int = 512):
+    from sentence_transformers import CrossEncoder
+
+    if backend == "onnx":
+        return CrossEncoder(model_name, device="cpu", max_length=max_length, backend="onnx",
+                            model_kwargs={"file_name": ONNX_INT8_FILE} if int8 else None)
+    model = CrossEncoder(model_name, device="cpu", max_length=max_length)
+    if int8:
+        import torch
+        # In place: newer sentence-transformers wrap the Hugging Face model, so it can't be swapped out
+        torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def passage(text: str, summary: str | None = None) -> str:
+    """What the cross-encoder reads for a document: its stored summary, then its text"""
+    return f"{summary}\n\n{text}" if summary else text
+
+
+class Reranker:
+    """Reorders retrieved candidates by cross-encoder relevance to the question.
+
+    Scores are cached by (model, index version, normalized question, document ID), so a
+    repeated question only scores candidates it has not seen, and nothing cached before
+    qdrant_vector_db re-indexes is served after: the in-memory entries are dropped and
+    the ones in the store are no longer looked up (its size limit evicts them). Uncached candidates are scored in batches in their retrieval order. With a
+    budget (seconds), the last batch is cut to the pairs expected to finish within it, and
+    the candidates left unscored keep their retrieval order behind the scored ones.
+    """
+
+    def __init__(self, model, model_name: str = DEFAULT_MODEL, batch_size: int = 16,
+                 budget: float | None = None, max_chars: int = 2000, maxsize: int = 4096,
+                 store: SQLiteCache | None = None, version_file: str = INDEX_VERSION_FILE):
+        self.model = model  # anything with CrossEncoder's predict(pairs, batch_size=...)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget = budget
+        self.max_chars = max_chars  # passages are cut before tokenizing; the model truncates anyway
+        self.maxsize = maxsize
+        self.store = store
+        self.version_file = version_file
+        self._version = read_index_version(version_file)
+        self._scores = OrderedDict()  # key -> score
+        self._lock = threading.Lock()
+        # Seconds per scored pair, smoothed; decides whether the next batch fits the budget
+        self._pair_seconds = None
+        self.latency = LatencyRecorder("Rerank latency")
+        self.hits = 0
+        self.misses = 0
+        self.cutoffs = 0
+
+    @classmethod
+    def open(cls, model_name: str = DEFAULT_MODEL, backend: str = "torch", int8: bool = False,
+             max_length: int = 512, **kwargs):
+        # Backends and quantization give slightly different scores, so they are cached apart
+        variant = f"{model_name}@{backend}{'-int8' if int8 else ''}"
+        return cls(load_cross_encoder(model_name, backend, int8, max_length), variant, **kwargs)
+
+    def _key(self, version, query: str, doc_id) -> str:
+        return SQLiteCache.make_key(self.model_name, version or "", normalize_query(query), str(doc_id))
+
+    def _current_version(self):
+        version = read_index_version(self.version_file)
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._scores.clear()
+        return version
+
+    def _cached(self, keys) -> dict:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[key] = self._scores[key]
+        if self.store is not None:
+            for key in keys:
+                if key not in found:
+                    value = self.store.get(key)
+                    if value is not None:
+                        found[key] = float(value)
+        return found
+
+    def _remember(self, scores: dict):
+        with self._lock:
+            self._scores.update(scores)
+            for key in scores:
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.maxsize:
+                self._scores.popitem(last=False)
+        if self.store is not None:
+            for key, score in scores.items():
+                self.store.set(key, repr(score))
+
+    def _predict(self, pairs) -> List[float]:
+        start = time.perf_counter()
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        per_pair = (time.perf_counter() - start) / len(pairs)
+        with self._lock:
+            self._pair_seconds = per_pair if self._pair_seconds is None else 0.8 * self._pair_seconds + 0.2 * per_pair
+        return [float(score) for score in scores]
+
+    def rerank(self, query: str, ids, passages, top_k: int | None = None) -> List[int]:
+        """Indices into ids/passages, most relevant first (top_k of them if given)"""
+        start = time.perf_counter()
+        version = self._current_version()
+        keys = [self._key(version, query, doc_id) for doc_id in ids]
+        scores = self._cached(keys)
+        hits = len(scores)
+        pending = [i for i, key in enumerate(keys) if key not in scores]
+
+        fresh = {}
+        while pending:
+            size = min(self.batch_size, len(pending))
+            with self._lock:
+                pair_seconds = self._pair_seconds
+            if self.budget is not None and pair_seconds is None:
+                size = 1  # time a single pair before committing the budget to a whole batch
+            elif self.budget is not None:
+                # Shrink the batch to what the rest of the budget is expected to cover
+                fits = int((self.budget - (time.perf_counter() - start)) / pair_seconds)
+                if fits < size:
+                    with self._lock:
+                        self.cutoffs += 1
+                    size = max(fits, 0)
+                    pending = pending[:size]
+            batch, pending = pending[:size], pending[size:]
+            if not batch:
+                break
+            batch_scores = self._predict([(query, passages[i][:self.max_chars]) for i in batch])
+            fresh.update((keys[i], score) for i, score in zip(batch, batch_scores))
+        if fresh:
+            self._remember(fresh)
+        scores.update(fresh)
+
+        scored = sorted((i for i, key in enumerate(keys) if key in scores), key=lambda i: -scores[keys[i]])
+        order = scored + [i for i, key in enumerate(keys) if key not in scores]
+        with self._lock:
+            self.hits += hits
+            self.misses += len(fresh)
+        self.latency.record(time.perf_counter() - start)
+        return order[:top_k] if top_k is not None else order
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "budget_cutoffs": self.cutoffs,
+                    "entries": len(self._scores),
+                    "ms_per_pair": 1000 * self._pair_seconds if self._pair_seconds is not None else None}
+
+    def summary(self) -> str:
+        s = self.stats()
+        lookups = s["hits"] + s["misses"]
+        return (f"Reranker: {s['misses']} pairs scored, {s['hits']} cached "
+                f"({s['hits'] / lookups if lookups else 0.0:.0%} hit rate), {s['budget_cutoffs']} budget cutoffs; "
+                + self.latency.summary())
+
+
+def from_env():
+    """The reranker configured by RERANK_MODEL (unset: no reranking), RERANK_BACKEND
+    (torch or onnx), RERANK_INT8, RERANK_BUDGET_MS and RERANK_CACHE_PATH"""
+    model_name = os.getenv("RERANK_MODEL")
+    if not model_name:
+        return None
+    return Reranker.open(
+        model_name,
+        backend=os.getenv("RERANK_BACKEND", "torch"),
+        int8=os.getenv("RERANK_INT8", "") not in {"", "0", "false"},
+        budget=float(os.getenv("RERANK_BUDGET_MS")) / 1000 if os.getenv("RERANK_BUDGET_MS") else None,
+        store=SQLiteCache(os.getenv("RERANK_CACHE_PATH")) if os.getenv("RERANK_CACHE_PATH") else None
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the BIPs collection and rerank the candidates.")
+    parser.add_argument("query")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float)
+    args = parser.parse_args()
+
+    import client
+    from content_store import resolve_sources
+
+    reranker = Reranker.open(args.model, args.backend, args.int8,
+                             budget=args.budget_ms / 1000 if args.budget_ms else None)
+    hits = client.search_hits(args.query, client.get_embedding(args.query), args.candidates)
+    sources = resolve_sources([hit.payload for hit in hits])
+    order = reranker.rerank(args.query, [hit.id for hit in hits],
+                            [passage(source, hit.payload.get("summary")) for hit, source in zip(hits, sources)],
+                            args.top_k)
+    for rank, i in enumerate(order, start=1):
+        print(f"{rank}. {hits[i].id} (retrieved #{i + 1}) {hits[i].payload.get('summary', '')[:100]!r}")
+    print(reranker.summary())
@@ -0,0 +1,183 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from content_store import resolve_sources
+from local_index import LocalHit
+from metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+# One retrieval layer over every store: the BIPs collection in Qdrant (client.py) and the
+# Bitcoin StackExchange collection in Chroma (bitcoin_stackexchange/main.py). Stores are
+# queried concurrently, so retrieval takes as long as the slowest store rather than the sum,
+# and their rankings are merged with reciprocal-rank fusion or min-max normalized scores.
+
+
+@dataclass
+class Hit:
+    id: str  # "<store>:<id in store>", unique across stores
+    text: str
+    store: str
+    score: float  # store's own similarity, higher is better; not comparable across stores
+    metadata: Dict = field(default_factory=dict)
+
+
+class QdrantSource:
+    """The BIPs collection searched by client.py"""
+
+    name = "bips"
+
+    def search(self, query: str, top_k: int, embedding=None) -> List[Hit]:
+        import client
+        if embedding is None:
+            embedding = client.get_embedding(query)
+        hits = client.search_hits(query, embedding, top_k)
+        return [Hit(id=f"{self.name}:{hit.id}", text=source, store=self.name,
+                    score=hit.score, metadata={"summary": hit.payload.get("summary")})
+                for hit, source in zip(hits, resolve_sources([hit.payload for hit in hits]))]
+
+
+class ChromaSource:
+    """The StackExchange collection used by BitcoinChatbot. It embeds queries with its own
+    model, so an embedding computed for Qdrant is ignored."""
+
+    name = "stackexchange"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @classmethod
+    def open(cls, db_path: str = "./bitcoin_stack_db", hf_token: str | None = None):
+        import chromadb
+        from bitcoin_stackexchange.main import NomicEmbeddingFunction
+
+        hf_token = hf_token or os.getenv('HUGGINGFACE_TOKEN')
+        if not hf_token:
+            raise ValueError("Please provide a HuggingFace token either directly or via HUGGINGFACE_TOKEN environment variable")
+        # One client per process; it is shared by every query thread
+        collection = chromadb.PersistentClient(path=db_path).get_collection(
+            name="bitcoin_stack_exchange",
+            embedding_function=NomicEmbeddingFunction(hf_token)
+        )
+        return cls(collection)
+
+    def search(self, query: str, top_k: int, embedding=None) -> List[Hit]:
+        results = self.collection.query(
+            query_texts=[f"search_document: {query}"],
+            n_results=top_k
+        )
+        return [Hit(id=f"{self.name}:{doc_id}", text=doc, store=self.name, score=1.0 - distance,
+                    metadata=metadata or {})
+                for doc_id, doc, metadata, distance in zip(results['ids'][0], results['documents'][0],
+                                                           results['metadatas'][0], results['distances'][0])]
+
+
+def _rrf(rankings, k: int):
+    scores, hits = {}, {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = str(hit.id)  # Qdrant and the local indexes may disagree on ID types
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            hits.setdefault(key, hit)
+    return scores, hits, sorted(scores, key=lambda hit_id: (-scores[hit_id], hit_id))
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hit]], k: int = 60) -> List[Hit]:
+    """Merge rankings by summed 1 / (k + rank); only positions matter, not raw scores"""
+    _, hits, order = _rrf(rankings, k)
+    return [hits[hit_id] for hit_id in order]
+
+
+def fuse_points(rankings, k: int = 60) -> List[LocalHit]:
+    """reciprocal_rank_fusion for Qdrant-style points (id, score, payload), e.g. dense and BM25
+    results. Each point's score is its fused score, so the fused list has one score scale"""
+    scores, hits, order = _rrf(rankings, k)
+    return [LocalHit(hits[key].id, scores[key], hits[key].payload) for key in order]
+
+
+def normalized_score_fusion(rankings: List[List[Hit]]) -> List[Hit]:
+    """Merge rankings by each hit's score min-max scaled within its own store"""
+    scores, hits = {}, {}
+    for ranking in rankings:
+        if not ranking:
+            continue
+        low = min(hit.score for hit in ranking)
+        spread = max(hit.score for hit in ranking) - low
+        for hit in ranking:
+            key = str(hit.id)
+            score = (hit.score - low) / spread if spread else 1.0
+            scores[key] = max(scores.get(key, 0.0), score)
+            hits.setdefault(key, hit)
+    return [hits[hit_id] for hit_id in sorted(scores, key=lambda hit_id: (-scores[hit_id], hit_id))]
+
+
+FUSIONS = {"rrf": reciprocal_rank_fusion, "normalized": normalized_score_fusion}
+
+
+class MultiRetriever:
+    """Queries every source in parallel and fuses their rankings.
+
+    A source that fails or is still running after timeout seconds is left out of that
+    query's results instead of holding it up.
+    """
+
+    def __init__(self, sources, fusion: str = "rrf", timeout: float | None = None, workers: int = 32):
+        self.sources = list(sources)
+        self.fuse = FUSIONS[fusion]
+        self.timeout = timeout
+        # Shared by concurrent queries (e.g. server.py handler threads)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval")
+        self.latency = LatencyRecorder("Retrieval latency")
+        self.source_latency = {source.name: LatencyRecorder(f"{source.name} latency") for source in self.sources}
+
+    def _timed_search(self, source, query, top_k, embedding):
+        start = time.perf_counter()
+        try:
+            return source.search(query, top_k, embedding=embedding)
+        finally:
+            self.source_latency[source.name].record(time.perf_counter() - start)
+
+    def search(self, query: str, top_k: int = 5, embedding=None) -> List[Hit]:
+        start = time.perf_counter()
+        futures = {self._pool.submit(self._timed_search, source, query, top_k, embedding): source
+                   for source in self.sources}
+        done, not_done = wait(futures, timeout=self.timeout)
+
+        rankings = []
+        for future in futures:
+            source = futures[future]
+            if future in not_done:
+                future.cancel()
+                logger.warning("%s did not answer within %.1fs; skipping it", source.name, self.timeout)
+            elif future.exception() is not None:
+                logger.warning("%s search failed: %s", source.name, future.exception())
+            else:
+                rankings.append(future.result())
+
+        hits = self.fuse(rankings)[:top_k]
+        self.latency.record(time.perf_counter() - start)
+        return hits
+
+    def summary(self) -> str:
+        return "\n".join([self.latency.summary()] + [r.summary() for r in self.source_latency.values()])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the BIPs and StackExchange stores together.")
+    parser.add_argument("query")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--fusion", choices=sorted(FUSIONS), default="rrf")
+    parser.add_argument("--stackexchange-db", default="./bitcoin_stack_db")
+    parser.add_argument("--timeout", type=float, help="Seconds to wait for the slowest store")
+    args = parser.parse_args()
+
+    retriever = MultiRetriever([QdrantSource(), ChromaSource.open(args.stackexchange_db)], args.fusion, args.timeout)
+    for i, hit in enumerate(retriever.search(args.query, args.top_k), start=1):
+        print(f"{i}. [{hit.store}] {hit.id} (score {hit.score:.3f})")
+        print(f"   {hit.text[:200]!r}")
+    print(retriever.summary())
@@ -0,0 +1,110 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+# qdrant_vector_db and local_index rewrite this file whenever the index changes; caches
+# compare its contents on every lookup and drop their answers when it differs. It sits
+# next to this module by default, so the ingest scripts and the bots agree on it whatever
+# directory each is started from; set INDEX_VERSION_FILE to keep it elsewhere.
+INDEX_VERSION_FILE = os.getenv("INDEX_VERSION_FILE",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), ".index_version"))
+
+
+def read_index_version(path: str = INDEX_VERSION_FILE) -> str | None:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def bump_index_version(path: str = INDEX_VERSION_FILE) -> str:
+    version = uuid.uuid4().hex
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+class SemanticCache:
+    """Answers keyed by query embedding and the IDs of the points retrieved for it.
+
+    A cached answer is returned when a new query's embedding is within threshold
+    cosine similarity of a cached one and retrieval returned the same points, so the
+    prompt context would be identical. Least recently used answers are evicted past maxsize.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 256, version_file: str = INDEX_VERSION_FILE):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.version_file = version_file
+        self._version = read_index_version(version_file)
+        self._entries = OrderedDict()  # id -> (unit embedding, point ids, answer)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self):
+        version = read_index_version(self.version_file)
+        if version != self._version:
+            self._version = version
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+    def lookup(self, embedding, point_ids) -> str | None:
+        point_ids = tuple(point_ids)
+        query = self._unit(embedding)
+        with self._lock:
+            self._check_version()
+            best_key, best_score = None, self.threshold
+            for key, (vector, ids, _) in self._entries.items():
+                if ids != point_ids:
+                    continue
+                score = float(np.dot(query, vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][2]
+
+    def store(self, embedding, point_ids, answer: str):
+        if not answer.strip():
+            return  # never serve an empty answer from the cache
+        with self._lock:
+            self._check_version()
+            self._entries[uuid.uuid4().hex] = (self._unit(embedding), tuple(point_ids), answer)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def summary(self) -> str:
+        with self._lock:
+            return (f"Answer cache: {self.hits} hits, {self.misses} misses, "
+                    f"{len(self._entries)} entries, {self.invalidations} invalidations")
+
+
+def from_env():
+    """The answer cache: ANSWER_CACHE_THRESHOLD is the cosine similarity a question needs to
+    reuse an earlier answer, ANSWER_CACHE_SIZE the number of answers kept. Answers are
+    dropped when INDEX_VERSION_FILE (default: .index_version beside this module) changes"""
+    return SemanticCache(threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+                         maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "256")))
@@ -0,0 +1,209 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import httpx
+from openai import APITimeoutError, OpenAI
+from qdrant_client import QdrantClient
+
+import client
+from serving import BatchingServer, Deadline, JSONHandler, MicroBatcher, RequestTimeout, request_timeout
+
+logger = logging.getLogger(__name__)
+
+# HTTP serving mode for the RAG bot in client.py.
+#   POST /ask    {"question": "...", "stream": false}  -> {"answer": "..."}
+#                with "stream": true the answer is sent as server-sent events, one {"token": ...} per event
+#   GET  /health
+#   GET  /stats  latency percentiles, embedding batch sizes and cache counters
+# Embedding calls from concurrent requests are micro-batched into single requests, the
+# OpenAI and Qdrant clients share pooled keep-alive connections across handler threads,
+# and every request has a deadline covering embedding, retrieval and generation.
+
+
+class EmbeddingBatcher(MicroBatcher):
+    """Embeds texts from concurrent requests in batched calls; see MicroBatcher for when a
+    batch is sent"""
+
+    item_name = "texts"
+
+    def __init__(self, embed_batch, max_batch: int = 32, max_wait: float = 0.005, workers: int = 2):
+        self.embed_batch = embed_batch
+        super().__init__(max_batch, max_wait, workers)
+
+    def _process(self, texts):
+        return self.embed_batch(texts)
+
+
+def configure_clients(qdrant_url: str, pool_size: int, timeout: float):
+    """Point client.py at pooled OpenAI and Qdrant clients shared by every handler thread"""
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    # Retries are left to the caller: the request deadline leaves no room for them
+    client.client = OpenAI(http_client=httpx.Client(limits=limits, timeout=timeout), max_retries=0)
+    # QdrantClient disables keep-alive for localhost unless it is given limits
+    client.qdrant = QdrantClient(url=qdrant_url, timeout=timeout, limits=limits)
+
+
+class RAGHandler(JSONHandler):
+    wbufsize = -1  # flushed explicitly after each response and each streamed event
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_event(self, body, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        self._write_chunk(f"{prefix}data: {json.dumps(body)}\n\n".encode("utf-8"))
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json({"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json({
+                **self.server.stats(),
+                "ttft_p50_ms": 1000 * client.ttft.percentile(50),
+                "ttft_p99_ms": 1000 * client.ttft.percentile(99),
+                "embedding_batches": self.server.batcher.stats(),
+                "embedding_cache": client.embedding_cache.stats(),
+                "answer_cache": client.answer_cache.summary(),
+                "reranker": client.reranker.stats() if client.reranker is not None else None,
+            })
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def do_POST(self):
+        if self.path != "/ask":
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+            return
+        try:
+            body = self._read_json()
+            question = body["question"].strip()
+            timeout = request_timeout(body, self.server.request_timeout)
+        except (ValueError, KeyError, AttributeError, TypeError):
+            self._send_json({"error": "expected a JSON object with a 'question' string and an optional "
+                                      "positive 'timeout' in seconds"}, status=400)
+            return
+
+        start = time.perf_counter()
+        deadline = Deadline(timeout)
+        try:
+            if body.get("stream"):
+                self._stream_answer(question, deadline)
+            else:
+                self._answer(question, deadline)
+        except RequestTimeout:
+            self.server.count_timeout()
+        finally:
+            self.server.request_latency.record(time.perf_counter() - start)
+
+    def _tokens(self, question: str, deadline: Deadline):
+        def embed():
+            future = self.server.batcher.submit(question)
+            try:
+                return future.result(timeout=deadline.remaining())
+            except FutureTimeoutError:
+                future.cancel()
+                raise RequestTimeout()
+
+        embedding = client.embedding_cache.get_or_compute(question, client.EMBEDDING_MODEL, embed)
+        # The remaining time bounds retrieval, and generation gets what retrieval leaves of it
+        tokens = client.stream_response(question, embedding=embedding, timeout=deadline.remaining())
+        try:
+            for token in tokens:
+                deadline.remaining()
+                yield token
+        except (APITimeoutError, TimeoutError):
+            raise RequestTimeout()
+        finally:
+            tokens.close()
+
+    def _answer(self, question: str, deadline: Deadline):
+        try:
+            answer = "".join(self._tokens(question, deadline)).strip()
+        except RequestTimeout:
+            self._send_json({"error": "request timed out"}, status=504)
+            raise
+        except Exception as e:
+            logger.exception("Request failed")
+            self._send_json({"error": str(e)}, status=502)
+            return
+        self._send_json({"answer": answer})
+
+    def _stream_answer(self, question: str, deadline: Deadline):
+        tokens = self._tokens(question, deadline)
+        try:
+            # Pull the first token before committing to a 200 so early failures get a real status
+            first = next(tokens, None)
+        except RequestTimeout:
+            self._send_json({"error": "request timed out"}, status=504)
+            raise
+        except Exception as e:
+            logger.exception("Request failed")
+            self._send_json({"error": str(e)}, status=502)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        disconnected = False
+        try:
+            if first is not None:
+                self._send_event({"token": first})
+            for token in tokens:
+                self._send_event({"token": token})
+        except (BrokenPipeError, ConnectionResetError):
+            # Nobody is left to read the rest; stop generating and drop the connection
+            disconnected = True
+            self.close_connection = True
+            logger.info("Client disconnected mid-stream")
+        except RequestTimeout:
+            self._send_event({"error": "request timed out"}, event="error")
+            raise
+        except Exception as e:
+            logger.exception("Request failed mid-stream")
+            self._send_event({"error": str(e)}, event="error")
+        finally:
+            tokens.close()
+            if not disconnected:
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+
+def start_server(host="127.0.0.1", port=8000, max_batch=32, max_wait=0.005, request_timeout=30.0):
+    """Start the server in a background thread and return it; port 0 picks a free port"""
+    batcher = EmbeddingBatcher(client.get_embeddings, max_batch=max_batch, max_wait=max_wait)
+    return BatchingServer((host, port), RAGHandler, batcher, request_timeout).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the RAG bot over HTTP with server-sent event streaming.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--qdrant-url", default="http://localhost:6333")
+    parser.add_argument("--pool-size", type=int, default=64, help="Keep-alive connections per upstream")
+    parser.add_argument("--max-batch", type=int, default=32, help="Most questions embedded in one request")
+    parser.add_argument("--max-wait", type=float, default=0.005, help="Seconds to wait for a batch to fill")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request deadline in seconds")
+    parser.add_argument("--stackexchange-db", help="Also retrieve from the StackExchange Chroma store at this path")
+    parser.add_argument("--fusion", choices=["rrf", "normalized"], default="rrf")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    configure_clients(args.qdrant_url, args.pool_size, args.timeout)
+    if args.stackexchange_db:
+        import retrieval
+        client.retriever = retrieval.MultiRetriever(
+            [retrieval.QdrantSource(), retrieval.ChromaSource.open(args.stackexchange_db)],
+            fusion=args.fusion, timeout=args.timeout
+        )
+    server = start_server(args.host, args.port, args.max_batch, args.max_wait, args.timeout)
+    print(f"RAG server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,174 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+# Pieces shared by the HTTP servers in server.py (RAG bot) and inference.py (fine-tuned
+# model): micro-batching of concurrent requests, per-request deadlines and JSON handling.
+
+
+class MicroBatcher:
+    """Collects items from concurrent requests and processes them in batches.
+
+    A batch is processed once it holds max_batch items or max_wait seconds after its first
+    item arrived, whichever comes first. Items that queue up while a batch is in flight go
+    out together in the next one. Subclasses implement _process, and set their own
+    attributes before calling this __init__, which starts the worker threads.
+    """
+
+    item_name = "items"  # what stats() calls the processed items
+
+    def __init__(self, max_batch: int, max_wait: float, workers: int = 1):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        for _ in range(workers):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Requests that gave up while queued are dropped here
+        return [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+
+    def _process(self, items: list) -> list:
+        """One result per item, in order"""
+        raise NotImplementedError
+
+    def _record(self, items: list, results: list, seconds: float):
+        """Update the counters after a batch; called with the lock held"""
+        self.batches += 1
+        self.items += len(items)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = self._process(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self._record(items, results, time.perf_counter() - start)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                self.item_name: self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
+
+
+class RequestTimeout(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        remaining = self.expires - time.monotonic()
+        if remaining <= 0:
+            raise RequestTimeout()
+        return remaining
+
+
+def request_timeout(body: dict, limit: float) -> float:
+    """The deadline a request body asks for with "timeout", in seconds, or limit without one"""
+    # A client may ask for a shorter deadline than the server's, never a longer one
+    timeout = min(float(body.get("timeout") or limit), limit)
+    if not timeout > 0:
+        raise ValueError("timeout must be positive")
+    return timeout
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.wfile.flush()
+
+
+class BatchingServer(ThreadingHTTPServer):
+    """Threaded HTTP server that hands work to a batcher and tracks latency and timeouts"""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, batcher, request_timeout: float):
+        super().__init__(address, handler)
+        self.batcher = batcher
+        self.request_timeout = request_timeout
+        self.request_latency = LatencyRecorder("Request latency")
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def count_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.request_latency.count,
+            "latency_p50_ms": 1000 * self.request_latency.percentile(50),
+            "latency_p99_ms": 1000 * self.request_latency.percentile(99),
+            "timeouts": self.timeouts,
+        }
+
+    def handle_error(self, request, client_address):
+        # A client that hung up mid-response leaves buffered output the handler can't flush
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def start(self):
+        """Serve in a background thread and return self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -1,16 +1,274 @@
-def split_text_into_chunks(file_path, output_path, chunk_size=200):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        text = file.read()
+import argparse
+import json
+import re
+from dataclasses import dataclass, asdict
 
-    cleaned_text = ' '.join(text.split())
+# Chunks follow document structure: a chunk never spans two documents or two sections,
+# and fenced code, <pre>/<source> blocks and {| tables |} are kept whole unless a single
+# one is larger than the chunk budget. Sizes are measured in embedding-model tokens.
 
-    words = cleaned_text.split()
+DEFAULT_TOKENIZER = "nomic-ai/nomic-embed-text-v1.5"
 
-    chunks = [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
-    formatted_text = '\n\n'.join(chunks)
-    with open(output_path, 'w', encoding='utf-8') as file:
-        file.write(formatted_text)
+DOC_SEPARATOR = "#######"  # between documents in bips.txt
+DOC_DELIMITER = "------"  # around document bodies written by github_parser.format_document
+DOC_TITLE_RE = re.compile(r'^\d+\. (\S+\.(?:md|mediawiki))\s*$')
+DOC_HEADER_RE = re.compile(r'^The following is a \w+ document located at (\S+)')
+HEADING_RE = re.compile(r'^(=+)[^=].*\1\s*$|^#{1,6}\s')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+PRE_OPEN_RE = re.compile(r'<(pre|source|syntaxhighlight)\b', re.IGNORECASE)
+PRE_CLOSE_RE = re.compile(r'</(pre|source|syntaxhighlight)>', re.IGNORECASE)
+TABLE_OPEN_RE = re.compile(r'^\s*\{\|')
+TABLE_CLOSE_RE = re.compile(r'^\s*\|\}')
+APPROX_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+UNIT_RES = [
+    re.compile(r'[^\n]*\n?'),  # lines
+    re.compile(r'.+?(?:[.!?](?=\s)|$)\s*', re.DOTALL),  # sentences
+    re.compile(r'\S+\s*'),  # words
+]
 
-input_file = 'bips.txt'
-output_file = 'split_bips.txt'
-split_text_into_chunks(input_file, output_file)
+
+@dataclass
+class Chunk:
+    text: str
+    source: str
+    start: int  # character offsets into the input file, end exclusive
+    end: int
+    tokens: int
+
+
+def approximate_token_count(text):
+    """Words and punctuation marks; close to WordPiece counts for English prose"""
+    return len(APPROX_TOKEN_RE.findall(text))
+
+
+def load_token_counter(model_name=DEFAULT_TOKENIZER):
+    """Token counter for the embedding model, falling back to an approximation without transformers"""
+    if model_name:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False, verbose=False))
+        except Exception as e:
+            print(f"Could not load tokenizer {model_name} ({e}); using approximate token counts")
+    return approximate_token_count
+
+
+def iter_blocks(file, max_block_chars=200_000):
+    """Yield (kind, text, start, end) for a text stream.
+
+    kind is "document" (text is the new source path), "heading" or "block". Blocks are
+    runs of lines separated by blank lines; protected regions are only split when they
+    exceed max_block_chars (e.g. an unterminated fence), which keeps memory bounded.
+    """
+    offset = 0
+    lines = []
+    block_chars = 0
+    start = 0
+    closer = None  # pattern that ends the protected region we are in
+
+    def flush():
+        nonlocal block_chars
+        text = ''.join(lines)
+        lines.clear()
+        block_chars = 0
+        return ("block", text, start, start + len(text)) if text.strip() else None
+
+    for line in file:
+        line_start = offset
+        offset += len(line)
+        stripped = line.strip()
+
+        if closer is None:
+            source = None
+            if stripped in (DOC_SEPARATOR, DOC_DELIMITER):
+                source = ""
+            else:
+                match = DOC_TITLE_RE.match(stripped) or DOC_HEADER_RE.match(stripped)
+                if match:
+                    source = match.group(1)
+            if source is not None or HEADING_RE.match(line) or not stripped:
+                block = flush()
+                if block:
+                    yield block
+                if source:
+                    yield ("document", source, line_start, offset)
+                elif source is None and stripped:
+                    yield ("heading", line, line_start, offset)
+                start = offset
+                continue
+
+        if not lines:
+            start = line_start
+        lines.append(line)
+        block_chars += len(line)
+
+        if closer is not None:
+            if closer.search(line):
+                closer = None
+        elif FENCE_RE.match(line):
+            closer = FENCE_RE
+        elif PRE_OPEN_RE.search(line) and not PRE_CLOSE_RE.search(line):
+            closer = PRE_CLOSE_RE
+        elif TABLE_OPEN_RE.match(line):
+            closer = TABLE_CLOSE_RE
+
+        if block_chars > max_block_chars:
+            block = flush()
+            if block:
+                yield block
+
+    block = flush()
+    if block:
+        yield block
+
+
+class Chunker:
+    def __init__(self, max_tokens=256, overlap_tokens=32, count_tokens=approximate_token_count):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = count_tokens
+
+    def _units(self, text, offset=0, level=0):
+        """(start, end, tokens) spans of text that each fit the budget, cut at the coarsest
+        boundary that works: line ends, then sentence ends, then word ends"""
+        for match in UNIT_RES[level].finditer(text):
+            if not match.group():
+                continue
+            tokens = self.count_tokens(match.group())
+            if tokens <= self.max_tokens or level == len(UNIT_RES) - 1:
+                yield offset + match.start(), offset + match.end(), tokens
+            else:
+                yield from self._units(match.group(), offset + match.start(), level + 1)
+
+    def _split_oversized(self, text, start, first_budget):
+        """Pieces of one oversized block, each within the token budget. The first piece
+        only gets first_budget tokens, so it can complete the chunk already in progress
+        (typically a section heading) instead of leaving that chunk on its own."""
+        budget = first_budget
+        piece_start = piece_end = None
+        piece_tokens = 0
+        for unit_start, unit_end, tokens in self._units(text):
+            if piece_start is not None and piece_tokens + tokens > budget:
+                yield text[piece_start:piece_end], start + piece_start, start + piece_end, piece_tokens
+                piece_start = None
+                budget = self.max_tokens
+            if piece_start is None:
+                piece_start, piece_tokens = unit_start, 0
+            piece_end = unit_end
+            piece_tokens += tokens
+        if piece_start is not None:
+            yield text[piece_start:piece_end], start + piece_start, start + piece_end, piece_tokens
+
+    def _tail(self, block, budget):
+        """A proper trailing slice of a block within budget tokens: its last sentences if
+        any fit, otherwise its last words; None if not even a word fits"""
+        text, start, end, _ = block
+        for pattern in UNIT_RES[1:]:
+            units = [match for match in pattern.finditer(text) if match.group()]
+            cut, tokens = None, 0
+            for match in reversed(units[1:]):  # never the whole block
+                unit_tokens = self.count_tokens(match.group())
+                if tokens + unit_tokens > budget:
+                    break
+                cut, tokens = match.start(), tokens + unit_tokens
+            if cut is not None:
+                return text[cut:], start + cut, end, tokens
+        return None
+
+    def chunk_stream(self, file, source):
+        current = []  # (text, start, end, tokens)
+        current_tokens = 0
+
+        def emit(overlap_tokens=0):
+            """The chunk in progress; the next one starts with up to overlap_tokens of its end"""
+            nonlocal current, current_tokens
+            chunk = Chunk(
+                text='\n'.join(text.strip('\n') for text, _, _, _ in current),
+                source=source,
+                start=current[0][1],
+                end=current[-1][2],
+                tokens=current_tokens,
+            )
+            carry, carry_tokens = [], 0
+            if overlap_tokens > 0:
+                for i in range(len(current) - 1, -1, -1):
+                    block = current[i]
+                    if i and carry_tokens + block[3] <= overlap_tokens:
+                        carry.insert(0, block)
+                        carry_tokens += block[3]
+                        continue
+                    # The first block that doesn't fit whole (or the chunk's only one) still
+                    # contributes its closing sentences or words
+                    tail = self._tail(block, overlap_tokens - carry_tokens)
+                    if tail:
+                        carry.insert(0, tail)
+                        carry_tokens += tail[3]
+                    break
+            current, current_tokens = carry, carry_tokens
+            return chunk
+
+        def add(block):
+            nonlocal current, current_tokens
+            if current and current_tokens + block[3] > self.max_tokens:
+                # As much overlap as the incoming block leaves room for
+                yield emit(min(self.overlap_tokens, self.max_tokens - block[3]))
+            current.append(block)
+            current_tokens += block[3]
+
+        for kind, text, start, end in iter_blocks(file):
+            if kind in ("document", "heading"):
+                if current:
+                    yield emit()
+                if kind == "document":
+                    source = text
+                    continue
+
+            tokens = self.count_tokens(text)
+            if tokens <= self.max_tokens:
+                yield from add((text, start, end, tokens))
+            else:
+                for piece in self._split_oversized(text, start, self.max_tokens - current_tokens):
+                    yield from add(piece)
+
+        if current:
+            yield emit()
+
+    def chunk_file(self, file_path):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            yield from self.chunk_stream(file, file_path)
+
+
+def split_text_into_chunks(file_path, output_path, max_tokens=256, overlap_tokens=32,
+                           count_tokens=approximate_token_count, output_format="txt"):
+    """Write chunks of file_path to output_path.
+
+    "txt" keeps the old layout for vector_db.sh: one chunk per paragraph with whitespace
+    collapsed. "jsonl" writes one Chunk per line with its source path, offsets and token count.
+    """
+    chunker = Chunker(max_tokens=max_tokens, overlap_tokens=overlap_tokens, count_tokens=count_tokens)
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for chunk in chunker.chunk_file(file_path):
+            if output_format == "jsonl":
+                out.write(json.dumps(asdict(chunk), ensure_ascii=False) + "\n")
+            else:
+                out.write(("\n\n" if count else "") + ' '.join(chunk.text.split()))
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split a document dump into structure-aware chunks.")
+    parser.add_argument("input_file", nargs="?", default="bips.txt")
+    parser.add_argument("output_file", nargs="?", default="split_bips.txt")
+    parser.add_argument("--max-tokens", type=int, default=256, help="Chunk size in embedding-model tokens")
+    parser.add_argument("--overlap", type=int, default=32, help="Tokens of trailing context repeated in the next chunk")
+    parser.add_argument("--tokenizer", default=DEFAULT_TOKENIZER, help="Hugging Face tokenizer to count tokens with; '' to approximate")
+    parser.add_argument("--format", choices=["txt", "jsonl"], default="txt")
+    args = parser.parse_args()
+
+    count = split_text_into_chunks(args.input_file, args.output_file, args.max_tokens, args.overlap,
+                                   load_token_counter(args.tokenizer), args.format)
+    print(f"Wrote {count} chunks to {args.output_file}")
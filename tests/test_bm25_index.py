@@ -0,0 +1,33 @@
+from bm25_index import BM25Index
+
+
+def test_reader_sees_another_instances_writes(tmp_path):
+    path = str(tmp_path / "bm25.sqlite")
+    writer = BM25Index(path)
+    writer.add_many([("1", "taproot schnorr signatures", {"source": "bip-340"})])
+    # A long-lived reader, like a bot that opened the index at import
+    reader = BM25Index(path)
+    assert [hit.id for hit in reader.search("taproot")] == ["1"]
+
+    writer.add_many([(str(i), f"filler document number {i} about taproot", {}) for i in range(2, 200)])
+    hits = reader.search("schnorr taproot", top_k=200)
+    assert hits[0].id == "1"
+    assert len(hits) == 199
+    assert "150" in reader
+
+    writer.delete(["1"])
+    assert "1" not in reader
+    assert "1" not in [hit.id for hit in reader.search("schnorr taproot", top_k=200)]
+
+
+def test_stale_instance_writes_on_top_of_newer_documents(tmp_path):
+    path = str(tmp_path / "bm25.sqlite")
+    first = BM25Index(path)
+    second = BM25Index(path)
+    first.add_many([("a", "segwit witness program", {})])
+    # Replacing "a" from an instance that never saw it must not leave two copies
+    second.add_many([("a", "segwit witness version", {}), ("b", "segwit address", {})])
+
+    assert sorted(hit.id for hit in first.search("segwit", top_k=10)) == ["a", "b"]
+    assert [hit.id for hit in first.search("program")] == []
+    assert len(first) == len(second) == 2
@@ -0,0 +1,52 @@
+from context_packer import ContextPacker
+
+
+def filler(topic, paragraphs=8):
+    return "\n\n".join(" ".join(f"Paragraph {p} discusses {topic} detail number {w}." for w in range(12))
+                       for p in range(paragraphs))
+
+
+def test_small_documents_are_used_whole():
+    packer = ContextPacker(max_tokens=500)
+    packed = packer.pack("what is taproot", [{"text": "Taproot is BIP 341."}, {"text": "Schnorr is BIP 340."}])
+
+    assert packed.text == "Taproot is BIP 341.\n---\nSchnorr is BIP 340."
+    assert packed.tokens == packed.unpacked_tokens + packer.count_tokens("\n---\n")
+
+
+def test_large_documents_are_packed_within_budget_keeping_relevant_chunks():
+    packer = ContextPacker(max_tokens=300, chunk_tokens=100)
+    relevant = "The OP_CHECKSIGADD opcode replaces OP_CHECKMULTISIG in tapscript."
+    documents = [
+        {"text": filler("fees") + "\n\n" + relevant + "\n\n" + filler("mempool"), "summary": "Summary of BIP 342."},
+        {"text": filler("wallets"), "summary": "Summary of BIP 44."},
+    ]
+
+    packed = packer.pack("what replaces OP_CHECKMULTISIG", documents)
+
+    assert packed.tokens <= 300
+    assert packed.unpacked_tokens > 300
+    assert "Summary of BIP 342." in packed.text and "Summary of BIP 44." in packed.text
+    assert relevant in packed.text
+    # Passages keep reading order: the first document's section comes first
+    assert packed.text.index("BIP 342") < packed.text.index("BIP 44")
+
+
+def test_near_duplicate_passages_are_packed_once():
+    packer = ContextPacker(max_tokens=200, chunk_tokens=60)
+    shared = "Segregated witness moves signatures out of the transaction into a separate witness structure."
+    documents = [{"text": f"## Background\n\n{shared}\n\n## Details\n\n{filler(topic, 4)}"}
+                 for topic in ("blocks", "nodes")]
+
+    packed = packer.pack("segregated witness signatures", documents)
+
+    assert packed.text.count(shared) == 1
+    assert packed.tokens <= 200
+
+
+def test_oversized_first_passage_is_truncated_to_budget():
+    packer = ContextPacker(max_tokens=20, chunk_tokens=100)
+    packed = packer.pack("detail", [{"text": " ".join(["word"] * 90) + "\n\n" + " ".join(["more"] * 90)}])
+
+    assert 0 < packed.tokens <= 20
+    assert packed.text.startswith("word word")
@@ -0,0 +1,56 @@
+import csv
+import os
+
+from data_augment import ProcessedIndex
+
+
+def write_rows(path, rows, mode="w"):
+    with open(path, mode, newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+    return os.path.getsize(path)
+
+
+def test_resume_loads_recorded_documents(tmp_path):
+    output = str(tmp_path / "augmented.csv")
+    index = ProcessedIndex(output)
+    assert len(index) == 0
+    size = write_rows(output, [["doc one", "Summary: one"], ["doc one", "Q: a\nA: b"]])
+    index.add("doc one", size)
+    size = write_rows(output, [["doc two", "Summary: two"]], mode="a")
+    index.add("doc two", size)
+    index.close()
+
+    resumed = ProcessedIndex(output)
+    assert "doc one" in resumed and "doc two" in resumed
+    assert "doc three" not in resumed
+    assert len(resumed) == 2
+    resumed.close()
+
+
+def test_rebuilds_from_csv_when_index_is_behind(tmp_path, capsys):
+    output = str(tmp_path / "augmented.csv")
+    index = ProcessedIndex(output)
+    index.add("doc one", write_rows(output, [["doc one", "Summary: one"]]))
+    index.close()
+    # A crash after the CSV flush but before the index write
+    write_rows(output, [["doc two", "Summary: two"], ["doc two", "Q: a\nA: b"]], mode="a")
+
+    rebuilt = ProcessedIndex(output)
+    assert "Rebuilding" in capsys.readouterr().out
+    assert "doc one" in rebuilt and "doc two" in rebuilt
+    assert len(rebuilt) == 2
+    rebuilt.close()
+
+    # The rebuilt index matches the CSV again, so the next run loads it as is
+    ProcessedIndex(output).close()
+    assert "Rebuilding" not in capsys.readouterr().out
+
+
+def test_rebuilds_for_output_without_an_index(tmp_path):
+    output = str(tmp_path / "augmented.csv")
+    write_rows(output, [["old doc", "Summary: old"]])
+
+    index = ProcessedIndex(output)
+    assert "old doc" in index
+    assert os.path.exists(output + ".idx")
+    index.close()
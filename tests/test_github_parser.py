@@ -0,0 +1,106 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from github_parser import GitHubCrawler
+
+FILES = {
+    "README.md": "# readme",
+    "bip-0001.mediawiki": "==BIP 1==\nbody",
+    "bip-0002/notes.md": "nested",
+    "drafts/wip.md": "excluded",
+    "code.py": "print(1)",
+}
+
+
+def blob_sha(content):
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class FakeGitHub(BaseHTTPRequestHandler):
+    """Just enough of the GitHub API for GitHubCrawler: repo metadata, a recursive tree and raw blobs"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, etag=None, content_type="application/json"):
+        self.server.requests.append(self.path)
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        if self.path == "/repos/user/repo":
+            return self._send(json.dumps({"default_branch": "master"}), '"repo"')
+        if self.path == "/repos/user/repo/git/trees/master?recursive=1":
+            tree = [{"path": path, "type": "blob", "sha": blob_sha(content),
+                     "url": f"{base}/repos/user/repo/git/blobs/{blob_sha(content)}"}
+                    for path, content in FILES.items()]
+            tree.append({"path": "bip-0002", "type": "tree", "sha": "0" * 40, "url": ""})
+            return self._send(json.dumps({"tree": tree, "truncated": False}), '"tree"')
+        for content in FILES.values():
+            if self.path == f"/repos/user/repo/git/blobs/{blob_sha(content)}":
+                return self._send(content, content_type="text/plain; charset=utf-8")
+        self.server.requests.append(self.path)
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def github():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHub)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(github, cache_dir):
+    crawler = GitHubCrawler(api_url=f"http://127.0.0.1:{github.server_address[1]}", token=None,
+                            cache_dir=str(cache_dir), workers=2)
+    rows = list(crawler.crawl("https://github.com/user/repo", exclude_folders=["drafts"]))
+    return crawler, rows
+
+
+def test_crawl_lists_wanted_files_from_the_tree(github, tmp_path):
+    crawler, rows = crawl(github, tmp_path)
+
+    assert rows == [{"Path": "README.md", "Content": "# readme"},
+                    {"Path": "bip-0001.mediawiki", "Content": "==BIP 1==\nbody"},
+                    {"Path": "bip-0002/notes.md", "Content": "nested"}]
+    # Repo metadata, one tree listing and one request per wanted blob
+    assert crawler.requests_made == 5
+    assert sum("/git/trees/" in path for path in github.requests) == 1
+
+
+def test_recrawl_reuses_etags_and_cached_blobs(github, tmp_path):
+    _, first = crawl(github, tmp_path)
+    github.requests.clear()
+
+    crawler, second = crawl(github, tmp_path)
+
+    assert second == first
+    # Metadata and tree are revalidated with 304s; no blob is downloaded again
+    assert crawler.requests_made == 2
+    assert crawler.not_modified == 2
+    assert crawler.blob_cache_hits == 3
+    assert not any("/git/blobs/" in path for path in github.requests)
@@ -0,0 +1,43 @@
+import gzip
+import json
+import os
+
+from data.llm_data import JsonlWriter
+
+
+def read_lines(path, opener=open):
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_shards_every_shard_size_records(tmp_path):
+    with JsonlWriter(str(tmp_path / "data.jsonl"), shard_size=2) as writer:
+        for i in range(5):
+            writer.write({"n": i})
+
+    assert [os.path.basename(p) for p in writer.paths] == ["data-00000.jsonl", "data-00001.jsonl", "data-00002.jsonl"]
+    assert [record["n"] for path in writer.paths for record in read_lines(path)] == [0, 1, 2, 3, 4]
+    assert writer.count == 5
+
+
+def test_gz_output_path_is_compressed(tmp_path):
+    with JsonlWriter(str(tmp_path / "data.jsonl.gz")) as writer:
+        writer.write({"instruction": "résumé"})
+
+    assert writer.paths == [str(tmp_path / "data.jsonl.gz")]
+    assert read_lines(writer.paths[0], gzip.open) == [{"instruction": "résumé"}]
+
+
+def test_compressed_shards(tmp_path):
+    with JsonlWriter(str(tmp_path / "data.jsonl"), shard_size=1, compress=True) as writer:
+        writer.write({"n": 0})
+        writer.write({"n": 1})
+
+    assert [os.path.basename(p) for p in writer.paths] == ["data-00000.jsonl.gz", "data-00001.jsonl.gz"]
+    assert read_lines(writer.paths[1], gzip.open) == [{"n": 1}]
+
+
+def test_empty_input_still_writes_a_file(tmp_path):
+    with JsonlWriter(str(tmp_path / "data.jsonl")) as writer:
+        pass
+    assert read_lines(writer.paths[0]) == []
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from local_index import LocalIndex
+
+
+def vectors(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def test_search_returns_nearest_points_first(tmp_path):
+    data = vectors(200)
+    index = LocalIndex.build(str(tmp_path / "index"), [f"p{i}" for i in range(200)], data,
+                             [{"n": i} for i in range(200)])
+
+    hits = index.search(data[17], top_k=3)
+    assert hits[0].id == "p17" and hits[0].payload == {"n": 17}
+    assert hits[0].score == pytest.approx(1.0)
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+
+
+def test_probing_every_ivf_list_matches_exact_search(tmp_path):
+    data = vectors(300)
+    ids = [str(i) for i in range(300)]
+    exact = LocalIndex.build(str(tmp_path / "exact"), ids, data, [{}] * 300)
+    ivf = LocalIndex.build(str(tmp_path / "ivf"), ids, data, [{}] * 300, nlist=16)
+
+    for query in vectors(5, seed=1):
+        assert [h.id for h in ivf.search(query, 10, nprobe=16)] == [h.id for h in exact.search(query, 10)]
+
+
+def test_nlist_larger_than_the_point_count_is_clamped(tmp_path):
+    data = vectors(5)
+    index = LocalIndex.build(str(tmp_path / "index"), list("abcde"), data, [{}] * 5, nlist=64)
+
+    assert len(index.centroids) == 5
+    assert index.search(data[2], top_k=1, nprobe=64)[0].id == "c"
+
+
+def test_empty_collection_exports_an_empty_index(tmp_path):
+    qdrant = QdrantClient(":memory:")
+    qdrant.create_collection("empty", vectors_config=models.VectorParams(size=8, distance=models.Distance.COSINE))
+
+    index = LocalIndex.from_qdrant(qdrant, "empty", str(tmp_path / "index"), nlist=16)
+
+    assert len(index) == 0
+    assert index.search(vectors(1)[0], top_k=3) == []
+    with pytest.raises(ValueError):
+        index.search(np.ones(4), top_k=3)
@@ -0,0 +1,57 @@
+import csv
+import hashlib
+
+import pytest
+from qdrant_client import QdrantClient
+
+import qdrant_vector_db
+
+
+def fake_embeddings(summaries):
+    if any("FAIL" in summary for summary in summaries):
+        raise RuntimeError("embedding endpoint down")
+    return [[b / 255 for b in hashlib.sha256(summary.encode()).digest()[:4]] for summary in summaries]
+
+
+@pytest.fixture
+def qdrant(monkeypatch, tmp_path):
+    client = QdrantClient(":memory:")
+    monkeypatch.setattr(qdrant_vector_db, "qdrant", client)
+    monkeypatch.setattr(qdrant_vector_db, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(qdrant_vector_db, "content_store", None)
+    monkeypatch.setattr(qdrant_vector_db, "bm25_index", None)
+    monkeypatch.setattr(qdrant_vector_db, "bump_index_version", lambda: None)
+    monkeypatch.setattr(qdrant_vector_db, "with_retries", lambda fn: fn())
+    qdrant_vector_db.create_collection(qdrant_vector_db.collection_name, 4, quantization="none", on_disk=False)
+    return client
+
+
+def sync(tmp_path, rows):
+    path = tmp_path / "augmented.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    qdrant_vector_db.insert_from_csv(str(path), batch_size=2, dead_letter_file=str(tmp_path / "failed.jsonl"))
+
+
+def summaries(client):
+    points, _ = client.scroll(qdrant_vector_db.collection_name, limit=100, with_payload=True)
+    return sorted(point.payload["summary"] for point in points)
+
+
+def test_sync_deletes_rows_no_longer_in_the_csv(qdrant, tmp_path):
+    sync(tmp_path, [[f"doc {i}", f"summary {i}"] for i in range(5)])
+    assert summaries(qdrant) == [f"summary {i}" for i in range(5)]
+
+    sync(tmp_path, [["doc 0", "summary 0"], ["doc 1", "summary 1 edited"], ["doc 4", "summary 4"]])
+    assert summaries(qdrant) == ["summary 0", "summary 1 edited", "summary 4"]
+
+
+def test_sync_keeps_stale_points_when_a_batch_fails(qdrant, tmp_path):
+    sync(tmp_path, [[f"doc {i}", f"summary {i}"] for i in range(4)])
+
+    # The edited row can't be embedded, so its old point must survive, as must every other stale point
+    sync(tmp_path, [["doc 0", "summary 0 FAIL"], ["doc 1", "summary 1"]])
+    assert summaries(qdrant) == [f"summary {i}" for i in range(4)]
+
+    sync(tmp_path, [["doc 0", "summary 0 fixed"], ["doc 1", "summary 1"]])
+    assert summaries(qdrant) == ["summary 0 fixed", "summary 1"]
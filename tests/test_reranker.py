@@ -0,0 +1,43 @@
+from reranker import Reranker
+from semantic_cache import bump_index_version
+from sqlite_cache import SQLiteCache
+
+
+class CountingModel:
+    """Scores a pair by how often the query's words appear in the passage"""
+
+    def __init__(self):
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size=16, show_progress_bar=False):
+        self.pairs += len(pairs)
+        return [sum(passage.count(word) for word in query.split()) for query, passage in pairs]
+
+
+def test_reranks_by_score_and_reuses_cached_scores(tmp_path):
+    model = CountingModel()
+    reranker = Reranker(model, version_file=str(tmp_path / "version"))
+    passages = ["nothing here", "taproot taproot", "taproot once"]
+
+    assert reranker.rerank("taproot", ["a", "b", "c"], passages) == [1, 2, 0]
+    assert reranker.rerank("Taproot?", ["a", "b", "c"], passages, top_k=1) == [1]
+    assert model.pairs == 3
+
+
+def test_reindexing_invalidates_stored_scores(tmp_path):
+    version_file = str(tmp_path / "version")
+    store = SQLiteCache(str(tmp_path / "scores.sqlite"))
+    bump_index_version(version_file)
+    model = CountingModel()
+    Reranker(model, store=store, version_file=version_file).rerank("taproot", ["a", "b"], ["taproot", "other"])
+    assert model.pairs == 2
+
+    # A restarted process finds the scores in the store...
+    Reranker(model, store=store, version_file=version_file).rerank("taproot", ["a", "b"], ["taproot", "other"])
+    assert model.pairs == 2
+
+    # ...until the index changes: document "a" is now different text and must be rescored
+    bump_index_version(version_file)
+    reranker = Reranker(model, store=store, version_file=version_file)
+    assert reranker.rerank("taproot", ["a", "b"], ["other", "taproot"]) == [1, 0]
+    assert model.pairs == 4
@@ -0,0 +1,56 @@
+import io
+
+from split import DOC_SEPARATOR, Chunker
+
+PARAGRAPHS = [" ".join(f"Sentence {p}.{s} has a few words." for s in range(6)) for p in range(4)]
+TEXT = "\n\n".join(PARAGRAPHS) + "\n"
+
+
+def chunks(text, **kwargs):
+    return list(Chunker(**kwargs).chunk_stream(io.StringIO(text), "bips.txt"))
+
+
+def test_chunks_stay_within_budget_and_offsets_point_at_their_text():
+    result = chunks(TEXT, max_tokens=60, overlap_tokens=0)
+
+    assert [chunk.text for chunk in result] == PARAGRAPHS
+    for chunk in result:
+        assert chunk.tokens <= 60
+        assert TEXT[chunk.start:chunk.end].strip("\n") == chunk.text
+        assert chunk.source == "bips.txt"
+
+
+def test_overlap_repeats_the_closing_sentences_of_a_paragraph():
+    result = chunks(TEXT, max_tokens=60, overlap_tokens=15)
+
+    assert len(result) == 4
+    for previous, chunk in zip(result, result[1:]):
+        carried = chunk.text.split("\n")[0]
+        assert carried and previous.text.endswith(carried)
+        assert carried != previous.text
+        assert TEXT[chunk.start:].startswith(carried)
+        assert chunk.tokens <= 60
+
+
+def test_oversized_paragraph_is_split_at_sentences():
+    paragraph = PARAGRAPHS[0]
+    result = chunks(paragraph + "\n", max_tokens=20, overlap_tokens=0)
+
+    assert len(result) == 3
+    assert "".join(chunk.text for chunk in result) == paragraph
+    for chunk in result:
+        assert chunk.tokens <= 20
+        assert chunk.text.startswith("Sentence")
+
+
+def test_chunks_never_cross_sections_or_documents():
+    text = ("# BIP 1\n\nFirst section text.\n\n## Motivation\n\nWhy it matters.\n\n"
+            f"{DOC_SEPARATOR}\n2. bip-0002.mediawiki\nSecond document body.\n")
+    result = chunks(text, max_tokens=200, overlap_tokens=10)
+
+    assert [chunk.text for chunk in result] == [
+        "# BIP 1\nFirst section text.", "## Motivation\nWhy it matters.", "Second document body."
+    ]
+    assert [chunk.source for chunk in result] == ["bips.txt", "bips.txt", "bip-0002.mediawiki"]
+    for chunk in result:
+        assert text[chunk.start:chunk.end].startswith(chunk.text.split("\n")[0])